@@ -0,0 +1,61 @@
+# bench_eval.py
+"""
+規則求值效能測試：比較單一行程與多行程 Z 區段平行求值的速度。
+使用需要逐格求值（無法向量化）的規則，才能看出多核心的效果。
+
+    python bench_eval.py [--workers N]
+"""
+import argparse
+import os
+import time
+
+from rule_eval import evaluate_rule
+from rule_pool import RuleWorkerPool
+
+# 對純量做 if 分支，會自動退回逐格模式
+BENCH_CODE = """def rule(x,y,z):
+    d = x*x + y*y + z*z
+    if d % 7 == 0:
+        return 1
+    elif (x + y) % 3 == 0:
+        return 4
+    return 0
+"""
+GRID_SIZES = [7, 32, 128]
+COLOR_IDS = tuple(range(1, 9))
+
+
+def run_pool(pool, half):
+    pool.submit(BENCH_CODE, half, COLOR_IDS)
+    while True:
+        result = pool.poll()
+        if result is not None: return result
+        time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    local_vars = {}
+    exec(BENCH_CODE, {}, local_vars); rule_func = local_vars["rule"]
+    single = RuleWorkerPool(timeout=600, workers=1)
+    parallel = RuleWorkerPool(timeout=600, workers=args.workers)
+    # 先跑一次小工作，確保所有行程都已啟動完畢
+    run_pool(single, 1); run_pool(parallel, args.workers * parallel.min_slab_layers // 2)
+
+    print(f"{'網格':>10} {'同行程':>10} {'1 行程':>10} {f'{args.workers} 行程':>10} {'加速':>8}")
+    for size in GRID_SIZES:
+        half = size // 2  # 網格邊長為 2 * half + 1
+        start = time.perf_counter(); evaluate_rule(rule_func, half, COLOR_IDS); inline = time.perf_counter() - start
+        start = time.perf_counter(); one = run_pool(single, half); t_one = time.perf_counter() - start
+        start = time.perf_counter(); many = run_pool(parallel, half); t_many = time.perf_counter() - start
+        assert one.ok and many.ok and (one.payload == many.payload).all()
+        edge = 2 * half + 1
+        print(f"{f'{edge}³':>10} {inline * 1000:>8.1f}ms {t_one * 1000:>8.1f}ms {t_many * 1000:>8.1f}ms {t_one / t_many:>7.2f}x")
+    single.shutdown(); parallel.shutdown()
+
+
+if __name__ == "__main__":
+    main()
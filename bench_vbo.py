@@ -0,0 +1,51 @@
+# bench_vbo.py
+"""
+頂點緩衝區建構效能測試：比較舊的逐方塊迴圈與向量化的 build_cube_buffer。
+
+    python bench_vbo.py
+"""
+import time
+
+import numpy as np
+
+from mesher import COLORS, CUBE_VERTICES, CUBE_NORMALS, build_cube_buffer
+
+VOXEL_COUNTS = [1_000, 10_000, 100_000]
+
+
+def build_cube_buffer_legacy(positions, color_ids, spacing=1.0):
+    """舊版 _update_vbo 的做法：每個方塊各自 reshape / tile / hstack / flatten"""
+    vbo_data = np.zeros(len(positions) * 24 * 9, dtype=np.float32)
+    offset = 0
+    for (x, y, z), color_id in zip(positions.tolist(), color_ids.tolist()):
+        pos_offset = np.array([x, y, z]) * spacing
+        vertices = CUBE_VERTICES.reshape(-1, 3) + pos_offset
+        color_arr = np.tile(COLORS[color_id], (24, 1))
+        normals = CUBE_NORMALS.reshape(-1, 3)
+        chunk = np.hstack([vertices, normals, color_arr]).flatten()
+        vbo_data[offset : offset + chunk.size] = chunk
+        offset += chunk.size
+    return vbo_data
+
+
+def best_of(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter(); func(*args); best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'方塊數':>10} {'舊版':>12} {'向量化':>12} {'加速':>10}")
+    for count in VOXEL_COUNTS:
+        positions = rng.integers(-64, 65, size=(count, 3))
+        color_ids = rng.integers(1, max(COLORS) + 1, size=count)
+        assert np.array_equal(build_cube_buffer_legacy(positions, color_ids), build_cube_buffer(positions, color_ids))
+        t_old = best_of(build_cube_buffer_legacy, positions, color_ids, repeat=1)
+        t_new = best_of(build_cube_buffer, positions, color_ids)
+        print(f"{count:>10} {t_old * 1000:>10.1f}ms {t_new * 1000:>10.2f}ms {t_old / t_new:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# completion_index.py
+"""
+編輯器自動補全的名稱索引（不依賴 PyQt）：以 ast 分析玩家的程式碼，找出在 wrap_code 包成的 rule(x, y, z) 中
+實際可用的名稱——參數、賦值與迴圈變數、import 進來的模組及其屬性，以及巢狀函式 / 類別 / 推導式內部才看得到的名稱。
+分析在背景執行緒進行；程式碼以頂層敘述切成區塊，內容沒變的區塊直接沿用上一次的分析結果。
+"""
+import ast
+import re
+import sys
+import textwrap
+import threading
+
+from debounce import DebouncedWorker
+from rule_eval import wrap_code
+
+RULE_PARAMETERS = tuple(arg.arg for arg in ast.parse(wrap_code("")).body[0].args.args)  # 與 wrap_code 的簽名一致
+# 這些開頭的行屬於前一個頂層敘述（if / try 的後續分支）
+_CONTINUATION = re.compile(r"(else|elif|except|finally)\b|[)\]}]")
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef,
+                ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+
+_module_attributes = {}  # 模組名稱 -> 公開屬性；只快取已載入模組的結果
+
+
+def module_attributes(module_name):
+    """
+    模組的公開屬性；只查詢已經載入的模組，不會為了補全而 import 新模組。
+    尚未載入的模組回傳 () 但不快取，之後遊戲或其他程式碼 import 了它就能查到。
+    """
+    attributes = _module_attributes.get(module_name)
+    if attributes is None:
+        module = sys.modules.get(module_name)
+        if module is None: return ()
+        attributes = _module_attributes[module_name] = tuple(name for name in dir(module) if not name.startswith("_"))
+    return attributes
+
+
+class _ChunkInfo:
+    """
+    一個頂層敘述區塊的分析結果，行號以區塊第一行為 0。
+    names 是 rule 函式範圍內的名稱 {名稱: 類別}，modules 是 {別名: 模組名稱}，
+    scopes 是 [(起始行, 結束行, {名稱: 類別})]，只在該行範圍內可見。
+    """
+    def __init__(self, tree):
+        self.names, self.modules, self.scopes = {}, {}, []
+        self._collect(tree, self.names)
+
+    def _collect(self, node, scope):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _SCOPE_NODES):
+                inner = {}
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    scope[child.name] = "function" if not isinstance(child, ast.ClassDef) else "class"
+                args = getattr(child, "args", None)  # 函式與 lambda 的參數；類別與推導式沒有
+                if args is not None:
+                    for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+                        if arg is not None: inner[arg.arg] = "parameter"
+                self.scopes.append((child.lineno - 1, child.end_lineno - 1, inner))
+                self._collect(child, inner)
+                continue
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                scope.setdefault(child.id, "variable")
+            elif isinstance(child, ast.ExceptHandler) and child.name:
+                scope.setdefault(child.name, "variable")
+            elif isinstance(child, ast.Import):
+                for alias in child.names:
+                    bound = alias.asname or alias.name.split(".")[0]
+                    scope[bound] = "module"; self.modules[bound] = alias.name if alias.asname else bound
+            elif isinstance(child, ast.ImportFrom) and child.module and not child.level:
+                for alias in child.names:
+                    if alias.name == "*":
+                        for name in module_attributes(child.module): scope.setdefault(name, "module")
+                    else:
+                        bound = alias.asname or alias.name
+                        scope[bound] = "module"
+                        if f"{child.module}.{alias.name}" in sys.modules: self.modules[bound] = f"{child.module}.{alias.name}"
+            self._collect(child, scope)
+
+
+def split_chunks(source):
+    """把程式碼依頂層敘述切成 [(起始行號, 文字)]；縮排行、註解、else / except 等分支與裝飾器後的 def 併入前一個區塊"""
+    chunks, start, lines, last_top = [], 0, source.split("\n"), ""
+    for i, line in enumerate(lines):
+        if not line or line[0].isspace() or line[0] == "#": continue
+        if i and not _CONTINUATION.match(line) and not last_top.startswith("@"):
+            chunks.append((start, "\n".join(lines[start:i]))); start = i
+        last_top = line
+    chunks.append((start, "\n".join(lines[start:])))
+    return chunks
+
+
+def _parse_chunk(text):
+    try:
+        return _ChunkInfo(ast.parse(textwrap.dedent(text)))
+    except (SyntaxError, ValueError):
+        return None
+
+
+class CompletionIndex:
+    """
+    某一版程式碼的分析結果。chunks 為 [(起始行號, _ChunkInfo)]，cache 為 {區塊文字: _ChunkInfo} 供下一次分析沿用。
+    names_at 的結果依所在範圍快取，同一個範圍內的行共用同一個 dict。
+    """
+    def __init__(self, chunks=(), cache=None):
+        self.chunks = list(chunks)
+        self.cache = cache or {}
+        self._names = {}  # scope_at 的結果 -> 該範圍可用的名稱
+
+    def scope_at(self, line):
+        """第 line 行（0 起算）所在的巢狀範圍，以 ((區塊序號, 範圍序號), ...) 表示；() 代表 rule 函式本身"""
+        return tuple((i, j) for i, (offset, info) in enumerate(self.chunks)
+                     for j, (start, end, _) in enumerate(info.scopes) if offset + start <= line <= offset + end)
+
+    def names_at(self, line):
+        """在第 line 行（0 起算）可用的名稱 {名稱: 類別}，包含已 import 模組的屬性（以 "別名.屬性" 表示）；回傳的 dict 為快取，不可修改"""
+        key = self.scope_at(line)
+        names = self._names.get(key)
+        if names is not None: return names
+        if key:
+            names = dict(self.names_at(-1))  # -1 不在任何巢狀範圍內，即 rule 函式本身的名稱
+            for i, j in key: names.update(self.chunks[i][1].scopes[j][2])
+        else:
+            names = {name: "parameter" for name in RULE_PARAMETERS}
+            for _, info in self.chunks:
+                names.update(info.names)
+                for alias, module_name in info.modules.items():
+                    for attr in module_attributes(module_name): names[f"{alias}.{attr}"] = "module"
+        self._names[key] = names
+        return names
+
+
+def build_index(source, previous=None):
+    """
+    分析 source 並回傳新的 CompletionIndex。內容與上一版相同的區塊直接沿用；
+    無法解析的區塊（例如正在輸入中）先嘗試與下一個區塊合併（括號跨越區塊時），仍失敗就沿用上一版同位置區塊的結果，
+    讓補全清單不會因為一行打到一半而整個消失。
+    """
+    previous = previous or CompletionIndex()
+    chunks, cache = [], {}
+    pieces = split_chunks(source)
+    i = 0
+    while i < len(pieces):
+        offset, text = pieces[i]; i += 1
+        info = previous.cache.get(text) or _parse_chunk(text)
+        if info is None and i < len(pieces):
+            merged = text + "\n" + pieces[i][1]
+            info = previous.cache.get(merged) or _parse_chunk(merged)
+            if info is not None: text = merged; i += 1
+        if info is not None: cache[text] = info
+        elif len(chunks) < len(previous.chunks): info = previous.chunks[len(chunks)][1]
+        if info is not None: chunks.append((offset, info))
+    return CompletionIndex(chunks, cache)
+
+
+class CompletionAnalyzer:
+    """
+    背景分析：submit() 只記下最新的程式碼，delay 秒內的連續修改合併成一次分析（見 debounce.DebouncedWorker），
+    完成後以新的 CompletionIndex 呼叫 on_update（在背景執行緒中呼叫，Qt 端應透過 signal 轉回主執行緒）。
+    """
+    def __init__(self, on_update, delay=0.15):
+        self.on_update = on_update
+        self.index = CompletionIndex()
+        self._pending = None
+        self._lock = threading.Lock()
+        self._worker = DebouncedWorker(self._analyze, delay, name="completion-index")
+
+    def submit(self, source):
+        with self._lock: self._pending = source
+        self._worker.notify()
+
+    def _analyze(self):
+        with self._lock: source, self._pending = self._pending, None
+        if source is None: return
+        self.index = build_index(source, self.index)
+        self.on_update(self.index)
+
+    def close(self):
+        """結束背景執行緒；尚未分析的程式碼直接捨棄"""
+        self._worker.close(process_pending=False)
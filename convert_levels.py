@@ -0,0 +1,48 @@
+# convert_levels.py
+"""
+把 JSON 關卡轉成二進位格式 (.vxl)。轉換後會重新讀取並比對方塊資料，一致才刪除原本的 JSON（除非指定 --keep-json）。
+關卡讀取時會自動判斷格式，兩種格式可以混用。
+
+    python convert_levels.py [levels_dir] [--keep-json] [--min-blocks N]
+"""
+import argparse
+import os
+
+from level_io import BINARY_EXTENSION, is_binary_level, load_level, save_level_binary
+
+
+def convert_level(path, keep_json=False):
+    """轉換單一關卡，回傳新檔案路徑"""
+    level = load_level(path)
+    target = os.path.splitext(path)[0] + BINARY_EXTENSION
+    save_level_binary(target, level["name"], level["store"], level["size"])
+    converted = load_level(target)
+    if converted["store"] != level["store"] or converted["name"] != level["name"]:
+        os.remove(target)
+        raise ValueError(f"轉換結果不一致: {path}")
+    if not keep_json: os.remove(path)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("levels_dir", nargs="?", default="levels")
+    parser.add_argument("--keep-json", action="store_true", help="保留原本的 JSON 檔")
+    parser.add_argument("--min-blocks", type=int, default=0, help="只轉換方塊數至少為 N 的關卡（小關卡維持可直接編輯的 JSON）")
+    args = parser.parse_args()
+
+    converted = 0
+    for filename in sorted(os.listdir(args.levels_dir)):
+        path = os.path.join(args.levels_dir, filename)
+        if not filename.endswith(".json") or filename.startswith(".") or is_binary_level(path): continue
+        try:
+            if len(load_level(path)["store"]) < args.min_blocks: continue
+            print(f"{path} -> {convert_level(path, args.keep_json)}")
+            converted += 1
+        except Exception as e:
+            print(f"警告：無法轉換 {path}: {e}")
+    print(f"共轉換 {converted} 個關卡")
+
+
+if __name__ == "__main__":
+    main()
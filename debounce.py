@@ -0,0 +1,55 @@
+# debounce.py
+"""背景執行緒的延遲合併（debounce）工具（不依賴 PyQt），供進度寫入與補全分析共用"""
+import threading
+import time
+
+
+class DebouncedWorker:
+    """
+    notify() 表示有新的工作；背景執行緒等到最後一次 notify 之後 delay 秒都沒有新的 notify 才呼叫 process()，
+    期間的多次 notify 只會處理一次。指定 max_delay 時，持續不斷的 notify 最多延後到這一批第一次 notify 之後 max_delay 秒。
+    process() 在背景執行緒中呼叫，工作內容（要處理的資料）由呼叫端自行保存；process() 期間的 notify 會排入下一批。
+    """
+    def __init__(self, process, delay, max_delay=None, name=None):
+        self.process = process
+        self.delay = delay
+        self.max_delay = max_delay
+        self._dirty = False
+        self._first_notify = self._last_notify = 0.0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._process_pending = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        with self._cond:
+            now = time.monotonic()
+            if not self._dirty: self._first_notify = now
+            self._dirty, self._last_notify = True, now
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed: self._cond.wait()
+                # notify 會叫醒 wait，所以每次醒來都要依最後一次 notify 的時間重新計算剩餘時間
+                while not self._closed:
+                    deadline = self._last_notify + self.delay
+                    if self.max_delay is not None: deadline = min(deadline, self._first_notify + self.max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: break
+                    self._cond.wait(remaining)
+                dirty, self._dirty = self._dirty, False
+                closed = self._closed
+                if closed and not self._process_pending: return
+            if dirty: self.process()
+            if closed: return
+
+    def close(self, process_pending=True):
+        """結束背景執行緒；process_pending 為 True 時尚未處理的工作會立即處理一次（不再等待 delay）"""
+        with self._cond:
+            self._closed = True
+            self._process_pending = process_pending
+            self._cond.notify()
+        self._thread.join()
@@ -1,30 +1,31 @@
 # editor.py
 import re
+from bisect import bisect_left
 from PyQt5.QtWidgets import QPlainTextEdit, QWidget, QTextEdit, QCompleter, QTableView, QStyle
-from PyQt5.QtCore import Qt, QRect, QSize, pyqtSignal, QSortFilterProxyModel
+from PyQt5.QtCore import Qt, QRect, QSize, pyqtSignal
 from PyQt5.QtGui import QColor, QPainter, QTextFormat, QFont, QStandardItemModel, QStandardItem, QTextCursor
 
 from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat
-from pygments import highlight
-from pygments.formatter import Formatter
+from pygments.lexer import ExtendedRegexLexer, LexerContext
 from pygments.lexers import PythonLexer
 from pygments.token import Token
 import pygments.styles
 
-# (CompleterProxyModel 和 Pygments/Highlighter 類別與上一版相同，保持不變)
-class CompleterProxyModel(QSortFilterProxyModel):
-    def filterAcceptsRow(self, source_row, source_parent):
-        if not self.filterRegExp().pattern(): return True
-        index = self.sourceModel().index(source_row, self.filterKeyColumn(), source_parent)
-        text = self.sourceModel().data(index)
-        return text.lower().startswith(self.filterRegExp().pattern().lower())
-
-class PygmentsFormatter(Formatter):
-    def __init__(self): super().__init__(); self.data = []
-    def format(self, tokensource, outfile): self.data = []; [self.data.append(t) for t in tokensource]
+from completion_index import CompletionAnalyzer, CompletionIndex
+
+class _StatefulPythonLexer(PythonLexer):
+    """PythonLexer 的規則搭配 ExtendedRegexLexer 的演算法：可以從指定的狀態堆疊開始，並在結束後讀出堆疊"""
+    get_tokens_unprocessed = ExtendedRegexLexer.get_tokens_unprocessed
+
+
 class PythonHighlighter(QSyntaxHighlighter):
+    """
+    逐行增量上色：每一行結束時的 lexer 狀態堆疊（例如仍在三引號字串中）編成整數存入 setCurrentBlockState，
+    下一行由該狀態接續；Qt 只會重新上色被修改的行，以及狀態因此改變的後續行。
+    token 類型到 QTextCharFormat 的對應是攤平的表格，沿 parent 往上找樣式只在第一次遇到該類型時做一次。
+    """
     def __init__(self, parent, style_name='nord'):
-        super().__init__(parent); self.formatter = PygmentsFormatter(); self.lexer = PythonLexer(); self.styles = {}
+        super().__init__(parent); self.lexer = _StatefulPythonLexer(); self.styles = {}
         pyg_style = pygments.styles.get_style_by_name(style_name)
         for ttype, style in pyg_style:
             color = style.get('color')
@@ -33,13 +34,28 @@ class PythonHighlighter(QSyntaxHighlighter):
                 if style.get('bold'): fmt.setFontWeight(QFont.Bold)
                 if style.get('italic'): fmt.setFontItalic(True)
                 self.styles[ttype] = fmt
+        self.formats = {ttype: self._resolve_format(ttype) for ttype, _ in pyg_style}
+        self.state_ids = {('root',): -1}  # 狀態堆疊 <-> 區塊狀態編號；-1 是 Qt 的預設值，代表一般程式碼
+        self.state_stacks = {-1: ('root',)}
+
+    def _resolve_format(self, ttype):
+        while ttype not in self.styles and ttype.parent: ttype = ttype.parent
+        return self.styles.get(ttype)
+
+    def _state_id(self, stack):
+        stack = tuple(stack)
+        if stack not in self.state_ids:
+            self.state_ids[stack] = len(self.state_stacks); self.state_stacks[self.state_ids[stack]] = stack
+        return self.state_ids[stack]
+
     def highlightBlock(self, text):
-        highlight(text, self.lexer, self.formatter); pos = 0
-        for ttype, value in self.formatter.data:
-            length = len(value); current_type = ttype
-            while current_type not in self.styles and current_type.parent: current_type = current_type.parent
-            if current_type in self.styles: self.setFormat(pos, length, self.styles[current_type])
-            pos += length
+        context = LexerContext(text + "\n", 0, stack=list(self.state_stacks.get(self.previousBlockState(), ('root',))))
+        for pos, ttype, value in self.lexer.get_tokens_unprocessed(context=context):
+            if pos >= len(text): continue  # 結尾補上的換行只用來讓 lexer 走完這一行的狀態
+            fmt = self.formats.get(ttype, False)
+            if fmt is False: fmt = self.formats[ttype] = self._resolve_format(ttype)
+            if fmt is not None: self.setFormat(pos, min(len(value), len(text) - pos), fmt)
+        self.setCurrentBlockState(self._state_id(context.stack))
 
 class LineNumberArea(QWidget):
     def __init__(self, editor): super().__init__(editor); self.codeEditor = editor
@@ -48,6 +64,8 @@ class LineNumberArea(QWidget):
 
 # --- 主編輯器 ---
 class CodeEditor(QPlainTextEdit):
+    indexReady = pyqtSignal(object)  # 背景分析完成的 CompletionIndex，轉回主執行緒處理
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setFont(QFont("Consolas", 12)); self.setLineWrapMode(QPlainTextEdit.NoWrap)
@@ -70,38 +88,61 @@ class CodeEditor(QPlainTextEdit):
         self.icons = {
             'keyword': style.standardIcon(QStyle.SP_DialogApplyButton),
             'built-in': style.standardIcon(QStyle.SP_ToolBarHorizontalExtensionButton),
-            'math': style.standardIcon(QStyle.SP_CommandLink),
+            'module': style.standardIcon(QStyle.SP_CommandLink),
             'variable': style.standardIcon(QStyle.SP_FileDialogDetailedView),
+            'parameter': style.standardIcon(QStyle.SP_FileDialogDetailedView),
         }
         self.completion_list = {
             'keywords': ['return', 'if', 'else', 'elif', 'for', 'in', 'while', 'def', 'class', 'and', 'or', 'not', 'True', 'False', 'None'],
             'built-in': ['abs', 'min', 'max', 'pow', 'round', 'int', 'float', 'str', 'len', 'range'],
-            'math': ['math.sin', 'math.cos', 'math.tan', 'math.sqrt', 'math.pi', 'math.e'],
-            'variables': ['x', 'y', 'z']
         }
         self.completer.activated[str].connect(self.insertCompletion)
-
-    def update_completer_model(self):
-        text = self.toPlainText(); user_vars = set(re.findall(r'\b([a-zA-Z_]\w*)\s*=', text))
-        model = QStandardItemModel()
-        all_words = {}
-        for category, words in self.completion_list.items():
-            for word in words: all_words[word] = category
-        for var in user_vars: all_words[var] = 'variable'
-        for word, category in sorted(all_words.items()):
-            item_name = QStandardItem(word)
-            if category in self.icons: item_name.setIcon(self.icons[category])
-            item_hint = QStandardItem(f"{category}")
-            item_hint.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            model.appendRow([item_name, item_hint])
-        proxy_model = CompleterProxyModel(self)
-        proxy_model.setSourceModel(model)
-        proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
-        proxy_model.setFilterKeyColumn(0)
-        self.completer.setModel(proxy_model)
-        self.completer_view.resizeColumnsToContents()
+        # 補全清單只建立一次：模型依不分大小寫排序，QCompleter 可用二分搜尋找出符合前綴的範圍，
+        # completion_keys 與模型列同序，供 bisect 找新增 / 刪除的位置
+        self.completion_model = QStandardItemModel(0, 2, self); self.completion_keys = []
+        self.builtin_category = {word: category for category, words in self.completion_list.items() for word in words}
+        for word, category in self.builtin_category.items(): self._insert_completion(word, category)
+        self.completer.setModel(self.completion_model); self.completer.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
         self.completer_view.setColumnWidth(0, 180); self.completer_view.setColumnWidth(1, 100)
-        
+        # 程式碼中的名稱（參數、變數、import 的模組與其屬性）由背景執行緒以 ast 分析，完成後只把差異套用到模型
+        self.completion_index = CompletionIndex(); self.dynamic_words = {}
+        self.completion_scope = None  # 目前模型對應的 (CompletionIndex, 範圍)，兩者都沒變時不必重新比較
+        self.analyzer = CompletionAnalyzer(self.indexReady.emit)
+        self.indexReady.connect(self._on_index_ready)
+        self.textChanged.connect(lambda: self.analyzer.submit(self.toPlainText()))
+        self._refresh_completions()
+
+    def _insert_completion(self, word, category):
+        row = bisect_left(self.completion_keys, (word.lower(), word)); self.completion_keys.insert(row, (word.lower(), word))
+        item_name = QStandardItem(word)
+        if category in self.icons: item_name.setIcon(self.icons[category])
+        item_hint = QStandardItem(f"{category}")
+        item_hint.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.completion_model.insertRow(row, [item_name, item_hint])
+
+    def _remove_completion(self, word):
+        row = bisect_left(self.completion_keys, (word.lower(), word))
+        del self.completion_keys[row]; self.completion_model.removeRow(row)
+
+    def _on_index_ready(self, index):
+        self.completion_index = index; self._refresh_completions()
+
+    def _refresh_completions(self):
+        """
+        收到新的分析結果或游標移到不同的巢狀範圍時，把該處可用的名稱與模型中現有的比較，
+        只新增 / 刪除有變動的列（巢狀函式內外可用的名稱不同）；其餘按鍵直接沿用現有的模型。
+        """
+        line = self.textCursor().blockNumber(); scope = (self.completion_index, self.completion_index.scope_at(line))
+        if scope == self.completion_scope: return
+        self.completion_scope = scope
+        words = {word: category for word, category in self.completion_index.names_at(line).items()
+                 if word not in self.builtin_category}  # 內建字詞本來就在清單中
+        for word, category in self.dynamic_words.items():
+            if words.get(word) != category: self._remove_completion(word)
+        for word, category in words.items():
+            if self.dynamic_words.get(word) != category: self._insert_completion(word, category)
+        self.dynamic_words = words
+
     def insertCompletion(self, completion):
         tc = self.textCursor(); prefix = self.completer.completionPrefix()
         extra = len(completion) - len(prefix)
@@ -110,7 +151,9 @@ class CodeEditor(QPlainTextEdit):
         self.setTextCursor(tc)
 
     def textUnderCursor(self):
-        tc = self.textCursor(); tc.select(tc.WordUnderCursor); return tc.selectedText()
+        """游標前的識別字，包含 "模組." 的部分，讓 math.s 可以比對到 math.sin"""
+        tc = self.textCursor(); match = re.search(r'[A-Za-z_][\w.]*$', tc.block().text()[:tc.positionInBlock()])
+        return match.group(0) if match else ""
 
     def keyPressEvent(self, event):
         """【核心修改】重寫鍵盤事件，實現 Tab 補全、區塊縮排等高級功能"""
@@ -185,9 +228,9 @@ class CodeEditor(QPlainTextEdit):
             popup.hide()
             return
         
-        self.update_completer_model()
+        self._refresh_completions()
         self.completer.setCompletionPrefix(prefix)
-        popup.setCurrentIndex(self.completer.model().index(0, 0))
+        popup.setCurrentIndex(self.completer.completionModel().index(0, 0))
         cr = self.cursorRect()
         cr.setWidth(popup.sizeHintForColumn(0) + popup.sizeHintForColumn(1) + 20)
         self.completer.complete(cr)
@@ -1,7 +1,8 @@
 import json
 from vpython import box, vector, scene
+from level_io import DEFAULT_GRID_SIZE, load_level
 
-GRID_RANGE = range(-3, 4)
+GRID_RANGE = range(-(DEFAULT_GRID_SIZE // 2), DEFAULT_GRID_SIZE // 2 + 1)
 
 def load_colors(path="colors.json"):
     with open(path, "r", encoding="utf-8") as f:
@@ -24,12 +25,12 @@ class GameEngine:
             b.visible = False
         self.blocks = []
 
-    def draw(self, rule_func):
+    def draw(self, rule_func, grid_range=GRID_RANGE):
         self.clear()
         result = {}
-        for x in GRID_RANGE:
-            for y in GRID_RANGE:
-                for z in GRID_RANGE:
+        for x in grid_range:
+            for y in grid_range:
+                for z in grid_range:
                     try:
                         cid = rule_func(x, y, z)
                     except Exception:
@@ -44,8 +45,7 @@ class GameEngine:
         return result
 
     def check_level(self, rule_func, level_path):
-        player_result = self.draw(rule_func)
-        with open(level_path, "r", encoding="utf-8") as f:
-            level = json.load(f)
-        target_blocks = {(tuple(b["pos"])): b["color"] for b in level["blocks"]}
-        return player_result == target_blocks
+        level = load_level(level_path)
+        half = level["half"]
+        player_result = self.draw(rule_func, range(-half, half + 1))
+        return player_result == dict(level["store"].items())
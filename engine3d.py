@@ -1,29 +1,184 @@
 # engine3d.py
 from PyQt5.QtWidgets import QOpenGLWidget
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QOpenGLContext
 from OpenGL.GL import *
 from OpenGL.GLU import *
-import OpenGL.GLUT as glut
+from OpenGL.GL import shaders
 import numpy as np
 import math
-import sys
-import random
-
-try: glut.glutInit(sys.argv)
-except Exception as e: print(f"警告：GLUT 初始化失敗: {e}")
-
-GRID_SIZE = 7
-CELL_SIZE = 1.0
-HALF = GRID_SIZE // 2
-COLORS = {
-    1: (1.0, 0.2, 0.2), 2: (1.0, 0.6, 0.0), 3: (1.0, 1.0, 0.0),
-    4: (0.1, 1.0, 0.1), 5: (0.0, 1.0, 1.0), 6: (0.3, 0.5, 1.0),
-    7: (1.0, 0.2, 1.0), 8: (0.95, 0.95, 0.95)
+from level_io import DEFAULT_GRID_SIZE
+from rule_eval import evaluate_rule
+from mesher import COLORS, CELL_SIZE, COLOR_LUT, CUBE_TEMPLATE, GIZMO_STRIDE, build_cube_buffer, build_face_buffer, build_gizmo_buffer, exposed_chunks
+from particles import ParticleSystem, PARTICLE_STRIDE
+from text_atlas import GlyphAtlas, LABEL_STRIDE
+
+MESH_CHUNK = 8  # 靜止網格以 8³ 格為一塊各自上傳，修改一格只需重建並上傳所在（與相鄰）的小區塊，上傳量不隨網格大小增加
+
+HALF = DEFAULT_GRID_SIZE // 2  # 載入關卡前的預設網格，關卡的實際大小由 set_grid_size 設定
+
+# 實例化繪製用的著色器：一份方塊網格 + 每個實例的位置與顏色，光照公式與固定管線的 GL_LIGHT0 設定相同
+# 剖面 (u_clip) 與建造動畫 (u_build_radius) 也在這裡判斷：被隱藏的方塊其所有頂點都移到裁切空間之外
+# a_offset.w 為 0 表示該實例槽位目前沒有方塊
+VOXEL_VERTEX_SHADER = """
+#version 120
+attribute vec3 a_position;
+attribute vec3 a_normal;
+attribute vec4 a_offset;
+attribute vec3 a_color;
+uniform float u_lit;
+uniform vec3 u_clip;
+uniform float u_build_radius;
+varying vec3 v_color;
+void main() {
+    vec3 cell = abs(a_offset.xyz);
+    if (a_offset.w < 0.5 || any(greaterThan(a_offset.xyz, u_clip)) || cell.x + cell.y + cell.z > u_build_radius) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        v_color = vec3(0.0);
+        return;
+    }
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(a_position + a_offset.xyz, 1.0);
+    if (u_lit > 0.5) {
+        vec3 n = normalize(gl_NormalMatrix * a_normal);
+        vec3 l = normalize(gl_LightSource[0].position.xyz);
+        vec3 ambient = gl_LightModel.ambient.rgb + gl_LightSource[0].ambient.rgb;
+        v_color = clamp(a_color * (ambient + gl_LightSource[0].diffuse.rgb * max(dot(n, l), 0.0)), 0.0, 1.0);
+    } else {
+        v_color = vec3(0.0);
+    }
+}
+"""
+VOXEL_FRAGMENT_SHADER = """
+#version 120
+varying vec3 v_color;
+void main() { gl_FragColor = vec4(v_color, 1.0); }
+"""
+VOXEL_ATTRIBUTES = ('a_position', 'a_normal', 'a_offset', 'a_color')
+UNLIMITED = 1.0e9  # 停用剖面或建造動畫時的 uniform 值
+INSTANCE_STRIDE = 7  # 每個實例：offset xyz + 是否使用中 + 顏色 rgb
+
+# 座標軸標籤：錨點經投影後再加上以像素計的偏移，文字固定大小且永遠面向螢幕（與 glRasterPos 的效果相同）
+LABEL_VERTEX_SHADER = """
+#version 120
+attribute vec3 a_anchor;
+attribute vec2 a_corner;
+attribute vec2 a_uv;
+attribute vec3 a_color;
+uniform vec2 u_viewport;
+varying vec2 v_uv;
+varying vec3 v_color;
+void main() {
+    vec4 p = gl_ModelViewProjectionMatrix * vec4(a_anchor, 1.0);
+    p.xy += a_corner * 2.0 / u_viewport * p.w;
+    gl_Position = p;
+    v_uv = a_uv;
+    v_color = a_color;
+}
+"""
+LABEL_FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D u_atlas;
+varying vec2 v_uv;
+varying vec3 v_color;
+void main() {
+    float alpha = texture2D(u_atlas, v_uv).a;
+    if (alpha < 0.05) discard;
+    gl_FragColor = vec4(v_color, alpha);
 }
+"""
+LABEL_ATTRIBUTES = ('a_anchor', 'a_corner', 'a_uv', 'a_color')
+
+
+def instance_rows(positions, color_ids):
+    """由格子座標 (N, 3) 與顏色編號 (N,) 產生實例資料列 (N, INSTANCE_STRIDE)"""
+    rows = np.zeros((len(positions), INSTANCE_STRIDE), dtype=np.float32)
+    rows[:, 0:3] = np.asarray(positions, dtype=np.float32).reshape(-1, 3) * CELL_SIZE
+    rows[:, 3] = 1.0
+    rows[:, 4:7] = COLOR_LUT[np.asarray(color_ids, dtype=np.intp)]
+    return rows
+
+
+def build_program(vertex_src, fragment_src, attributes):
+    """編譯並連結著色器；依序把 attributes 綁定到 location 0, 1, 2...，避免與固定管線的頂點陣列互相干擾"""
+    program = glCreateProgram()
+    glAttachShader(program, shaders.compileShader(vertex_src, GL_VERTEX_SHADER))
+    glAttachShader(program, shaders.compileShader(fragment_src, GL_FRAGMENT_SHADER))
+    for location, name in enumerate(attributes): glBindAttribLocation(program, location, name)
+    glLinkProgram(program)
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE: raise RuntimeError(glGetProgramInfoLog(program))
+    return program
+
+
+class SharedGLResources:
+    """
+    同一個 context share group 內所有視窗共用的 GL 資源：著色器、方塊網格、字元貼圖、外框與標籤的 VBO。
+    應用程式設定 Qt.AA_ShareOpenGLContexts 後，遊戲視窗與目標預覽只會建立一份；
+    各視窗自己的方塊資料 (instance / mesh VBO) 仍然分開保存。
+    """
+    _groups = {}
+
+    @classmethod
+    def current(cls):
+        """目前 context 所屬 share group 的資源，第一次呼叫時建立"""
+        group = QOpenGLContext.currentContext().shareGroup()
+        if group not in cls._groups: cls._groups[group] = cls()
+        return cls._groups[group]
+
+    def __init__(self):
+        self.gizmo_buffers = {}  # {half: (vbo_id, ranges)}
+        self.label_buffers = {}  # {(half, 隱藏的軸, x/y/z 正負): (vbo_id, vertex_count)}
+        self._init_instancing()
+        self._init_labels()
+
+    def _init_instancing(self):
+        try:
+            if not (bool(glDrawArraysInstanced) and bool(glVertexAttribDivisor)): raise RuntimeError("缺少 glDrawArraysInstanced / glVertexAttribDivisor")
+            self.voxel_program = build_program(VOXEL_VERTEX_SHADER, VOXEL_FRAGMENT_SHADER, VOXEL_ATTRIBUTES)
+            self.u_lit, self.u_clip, self.u_build_radius = [glGetUniformLocation(self.voxel_program, name) for name in ("u_lit", "u_clip", "u_build_radius")]
+            cube_mesh = np.ascontiguousarray(CUBE_TEMPLATE[:, 0:6])
+            self.cube_mesh_vbo = int(glGenBuffers(1))
+            glBindBuffer(GL_ARRAY_BUFFER, self.cube_mesh_vbo)
+            glBufferData(GL_ARRAY_BUFFER, cube_mesh.nbytes, cube_mesh, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.instancing = True
+        except Exception as e:
+            print(f"警告：無法使用實例化繪製，改用逐方塊繪製: {e}")
+            self.voxel_program = None
+            self.instancing = False
 
-hs = CELL_SIZE / 2.0
-CUBE_VERTICES = np.array([-hs,-hs,hs, hs,-hs,hs, hs,hs,hs, -hs,hs,hs, -hs,-hs,-hs, -hs,hs,-hs, hs,hs,-hs, hs,-hs,-hs, hs,-hs,-hs, hs,hs,-hs, hs,hs,hs, hs,-hs,hs, -hs,-hs,hs, -hs,hs,hs, -hs,hs,-hs, -hs,-hs,-hs, -hs,hs,hs, hs,hs,hs, hs,hs,-hs, -hs,hs,-hs, -hs,-hs,-hs, hs,-hs,-hs, hs,-hs,hs, -hs,-hs,hs], dtype=np.float32)
-CUBE_NORMALS = np.array([0,0,1,0,0,1,0,0,1,0,0,1, 0,0,-1,0,0,-1,0,0,-1,0,0,-1, 1,0,0,1,0,0,1,0,0,1,0,0, -1,0,0,-1,0,0,-1,0,0,-1,0,0, 0,1,0,0,1,0,0,1,0,0,1,0, 0,-1,0,0,-1,0,0,-1,0,0,-1,0], dtype=np.float32)
+    def _init_labels(self):
+        try:
+            self.label_program = build_program(LABEL_VERTEX_SHADER, LABEL_FRAGMENT_SHADER, LABEL_ATTRIBUTES)
+            self.u_viewport = glGetUniformLocation(self.label_program, 'u_viewport')
+            self.u_atlas = glGetUniformLocation(self.label_program, 'u_atlas')
+            self.glyph_atlas = GlyphAtlas()
+            self.label_texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.label_texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST);glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            pixels = np.ascontiguousarray(self.glyph_atlas.pixels())
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.glyph_atlas.width, self.glyph_atlas.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+            glBindTexture(GL_TEXTURE_2D, 0)
+        except Exception as e:
+            print(f"警告：無法建立座標軸標籤的著色器，將不顯示標籤: {e}")
+            self.label_program = None
+
+    def gizmo_buffer(self, half):
+        if half not in self.gizmo_buffers:
+            vbo_data, ranges = build_gizmo_buffer(half)
+            vbo = int(glGenBuffers(1))
+            glBindBuffer(GL_ARRAY_BUFFER, vbo);glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STATIC_DRAW);glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.gizmo_buffers[half] = (vbo, ranges)
+        return self.gizmo_buffers[half]
+
+    def label_buffer(self, key, labels):
+        """labels 為產生標籤清單的函式，只有在 key 第一次出現時才呼叫"""
+        if key not in self.label_buffers:
+            vbo_data = self.glyph_atlas.layout(labels())
+            vbo = int(glGenBuffers(1))
+            glBindBuffer(GL_ARRAY_BUFFER, vbo);glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STATIC_DRAW);glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.label_buffers[key] = (vbo, len(vbo_data) // LABEL_STRIDE)
+        return self.label_buffers[key]
 
 
 class VoxelGLWidget(QOpenGLWidget):
@@ -32,78 +187,285 @@ class VoxelGLWidget(QOpenGLWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.angle_x, self.angle_y, self.distance = 25.0, -30.0, 20.0
-        self.last_mouse, self.quadric = None, None
+        self.half = HALF
+        self.last_mouse = None
         self.rule_func = lambda x, y, z: 0
-        self.voxels = {}
+        self.volume = np.zeros((DEFAULT_GRID_SIZE,) * 3, dtype=np.int8)
+        self.voxel_positions = np.zeros((0, 3), dtype=np.int32)
+        self.voxel_colors = np.zeros(0, dtype=np.int8)
         self.sorted_voxel_keys = []
         self.vbo_id = None
         self.vertex_count = 0
+        # 靜止畫面改用剔除內部面後的網格：'culled' 只剔除被遮住的面，'greedy' 另外合併同色共平面的面，'cubes' 停用
+        self.mesh_mode = 'culled'
+        self.mesh_chunks = {}  # {(cx, cy, cz): {'line' / 'fill': (vbo_id, vertex_count)}}
+        self.max_radius = 0
+        # 著色器、方塊網格、外框與標籤等共用資源，在 initializeGL 時取得
+        self.shared = None
+        # 實例化繪製：顯示卡不支援時退回逐方塊的 glDrawArrays
+        self.instancing = False
+        self.instance_vbo = None
+        # 實例緩衝區以槽位配置：每個方塊佔一個槽位，修改時只以 glBufferSubData 更新變動的槽位
+        self.uploaded_volume = None  # GPU 上目前反映的 volume，用來與新結果做差異比對
+        self.instance_data = np.zeros((0, INSTANCE_STRIDE), dtype=np.float32)  # CPU 端的鏡像
+        self.slot_of = None  # 與 volume 同形狀，每格對應的槽位，-1 表示沒有方塊
+        self.free_slots = []
+        self.instance_count = 0
+        self.last_upload = {'bytes': 0, 'cells': 0}  # 最近一次修改上傳到 GPU 的位元組數與變動格數
         self.visible_vertex_count = 0
         self.gl_initialized = False
         self.tick = 0
         self.animation_mode = 'build'
-        self.particles = []
+        self.particles = ParticleSystem()
+        self.particle_vbo = None
+        self.viewport = (1, 1)
+        # 只有在動畫或粒子進行中才啟動計時器；靜止時完全依事件 (update()) 重繪
         self.anim_timer = QTimer(self)
+        self.anim_timer.setInterval(30)
         self.anim_timer.timeout.connect(self._on_tick)
-        self.anim_timer.start(30)
         self.slicing_config = {}
 
+    def set_grid_size(self, size):
+        """切換網格大小（邊長為奇數），清空目前的方塊"""
+        self.half = size // 2
+        self.set_volume(np.zeros((size, size, size), dtype=np.int8))
+
+    def set_mesh_mode(self, mode):
+        self.mesh_mode = mode
+        if self.gl_initialized: self.makeCurrent(); self._update_mesh(None); self.doneCurrent()
+        self.update()
+
     def set_slicing_config(self, config):
         self.slicing_config = config
         self.update()
 
     def initializeGL(self):
-        glEnable(GL_DEPTH_TEST);glEnable(GL_CULL_FACE);glCullFace(GL_BACK);glEnable(GL_COLOR_MATERIAL);glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE);glEnable(GL_LIGHTING);glEnable(GL_LIGHT0);glLightfv(GL_LIGHT0, GL_POSITION, (1.0, 1.0, 1.0, 0.0));glLightfv(GL_LIGHT0, GL_DIFFUSE, (1.0, 1.0, 1.0, 1.0));glLightfv(GL_LIGHT0, GL_AMBIENT, (0.4, 0.4, 0.4, 1.0));glClearColor(0.1, 0.12, 0.15, 1.0);self.quadric = gluNewQuadric();self.vbo_id = glGenBuffers(1);self.gl_initialized = True;self._update_vbo()
+        glEnable(GL_DEPTH_TEST);glEnable(GL_CULL_FACE);glCullFace(GL_BACK);glEnable(GL_COLOR_MATERIAL);glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE);glEnable(GL_LIGHTING);glEnable(GL_LIGHT0);glLightfv(GL_LIGHT0, GL_POSITION, (1.0, 1.0, 1.0, 0.0));glLightfv(GL_LIGHT0, GL_DIFFUSE, (1.0, 1.0, 1.0, 1.0));glLightfv(GL_LIGHT0, GL_AMBIENT, (0.4, 0.4, 0.4, 1.0));glClearColor(0.1, 0.12, 0.15, 1.0);self.vbo_id = glGenBuffers(1);self.particle_vbo = glGenBuffers(1);self.instance_vbo = int(glGenBuffers(1));self.shared = SharedGLResources.current();self.instancing = self.shared.instancing;self.gl_initialized = True;self._update_vbo()
 
     def _update_voxel_cache(self):
-        self.voxels.clear()
-        coords = [(x,y,z) for z in range(-HALF,HALF+1) for y in range(-HALF,HALF+1) for x in range(-HALF,HALF+1)]
-        for x, y, z in coords:
-            try:
-                color_id = self.rule_func(x, y, z)
-                if color_id in COLORS: self.voxels[(x, y, z)] = color_id
-            except Exception: continue
-        self.sorted_voxel_keys = sorted(self.voxels.keys(), key=lambda k: abs(k[0]) + abs(k[1]) + abs(k[2]))
+        """方塊座標與顏色（argwhere 的順序）；依距離排序只有逐方塊繪製的後備路徑需要，在 _update_vbo 中才做"""
+        cells = np.argwhere(self.volume)
+        self.voxel_colors = self.volume[tuple(cells.T)]
+        self.voxel_positions = cells - self.half
+        self.max_radius = int(np.abs(self.voxel_positions).sum(axis=1).max()) if len(self.voxel_positions) else 0
 
     def _update_vbo(self):
-        if not self.voxels or not self.gl_initialized: self.vertex_count = 0; return
-        num_voxels = len(self.sorted_voxel_keys)
-        vbo_data = np.zeros(num_voxels * 24 * 9, dtype=np.float32)
-        spacing = 1.0
-        offset = 0
-        for i, key in enumerate(self.sorted_voxel_keys):
-            color_id = self.voxels[key]
-            x, y, z = key
-            pos_offset = np.array([x, y, z]) * spacing
-            vertices = CUBE_VERTICES.reshape(-1, 3) + pos_offset
-            color_arr = np.tile(COLORS[color_id], (24, 1))
-            normals = CUBE_NORMALS.reshape(-1, 3)
-            chunk = np.hstack([vertices, normals, color_arr]).flatten()
-            vbo_data[offset : offset + chunk.size] = chunk
-            offset += chunk.size
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo_id)
-        glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STATIC_DRAW)
+        """把 self.volume 同步到 GPU：與上次上傳的 volume 比對，只更新變動的格子"""
+        if not self.gl_initialized: return
+        old = self.uploaded_volume
+        full = old is None or old.shape != self.volume.shape
+        changed = None if full else np.flatnonzero(old.reshape(-1) != self.volume.reshape(-1))
+        self.uploaded_volume = self.volume.copy()
+        self.vertex_count = len(self.voxel_positions) * 24
+        uploaded = 0
+        if self.instancing:
+            uploaded += self._reset_instances() if full else self._update_instances(changed)
+        else:
+            # 後備路徑逐方塊 glDrawArrays，建造動畫依距離由近到遠畫出，所以方塊要排序並保留座標清單
+            order = np.argsort(np.abs(self.voxel_positions).sum(axis=1), kind='stable')
+            self.voxel_positions, self.voxel_colors = self.voxel_positions[order], self.voxel_colors[order]
+            self.sorted_voxel_keys = [tuple(p) for p in self.voxel_positions.tolist()]
+            if self.vertex_count:
+                vbo_data = build_cube_buffer(self.voxel_positions, self.voxel_colors)
+                glBindBuffer(GL_ARRAY_BUFFER, self.vbo_id)
+                glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STATIC_DRAW)
+                glBindBuffer(GL_ARRAY_BUFFER, 0)
+                uploaded += vbo_data.nbytes
+        uploaded += self._update_mesh(None if full else changed)
+        self.last_upload = {'bytes': uploaded, 'cells': self.volume.size if full else len(changed)}
+
+    def _instance_rows(self, flat_cells):
+        """由 volume 的平面索引產生實例資料列"""
+        positions = np.stack(np.unravel_index(flat_cells, self.volume.shape), axis=1) - self.half
+        return instance_rows(positions, self.volume.reshape(-1)[flat_cells])
+
+    def _reset_instances(self):
+        """重新配置所有槽位（第一次上傳或網格大小改變時）"""
+        cells = np.flatnonzero(self.volume.reshape(-1))
+        self.instance_data = self._instance_rows(cells)
+        self.slot_of = np.full(self.volume.shape, -1, dtype=np.int32)
+        self.slot_of.reshape(-1)[cells] = np.arange(len(cells), dtype=np.int32)
+        self.free_slots = []
+        self.instance_count = len(cells)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.instance_data.nbytes, self.instance_data, GL_DYNAMIC_DRAW)
         glBindBuffer(GL_ARRAY_BUFFER, 0)
-        self.vertex_count = num_voxels * 24
+        return self.instance_data.nbytes
+
+    def _update_instances(self, changed):
+        """依變動的格子更新槽位：刪除的方塊釋放槽位，新增的方塊優先重用空槽位，改色的方塊就地覆寫"""
+        if not len(changed): return 0
+        slot_flat = self.slot_of.reshape(-1)
+        new_colors = self.volume.reshape(-1)[changed]
+        removed = changed[new_colors == 0]
+        freed = slot_flat[removed]
+        slot_flat[removed] = -1
+        self.instance_data[freed] = 0.0
+        self.free_slots.extend(freed.tolist())
+
+        kept = changed[(new_colors != 0) & (slot_flat[changed] >= 0)]
+        added = changed[(new_colors != 0) & (slot_flat[changed] < 0)]
+        reuse = min(len(added), len(self.free_slots))
+        new_slots = np.array(self.free_slots[len(self.free_slots) - reuse:] if reuse else [], dtype=np.int32)
+        del self.free_slots[len(self.free_slots) - reuse:]
+        appended = np.arange(self.instance_count, self.instance_count + len(added) - reuse, dtype=np.int32)
+        new_slots = np.concatenate([new_slots, appended])
+        slot_flat[added] = new_slots
+        self.instance_count += len(appended)
+
+        grow = self.instance_count > len(self.instance_data)
+        if grow:
+            capacity = max(self.instance_count, 2 * len(self.instance_data), 256)
+            self.instance_data = np.concatenate([self.instance_data, np.zeros((capacity - len(self.instance_data), INSTANCE_STRIDE), dtype=np.float32)])
+        touched = np.concatenate([kept, added])
+        self.instance_data[slot_flat[touched]] = self._instance_rows(touched)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        if grow:
+            glBufferData(GL_ARRAY_BUFFER, self.instance_data.nbytes, self.instance_data, GL_DYNAMIC_DRAW)
+            uploaded = self.instance_data.nbytes
+        else:
+            uploaded = self._upload_slots(np.concatenate([freed, slot_flat[touched]]))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return uploaded
+
+    def _upload_slots(self, slots, max_runs=32):
+        """把變動的槽位合併成連續區段後以 glBufferSubData 上傳；區段太多時改為上傳整個涵蓋範圍"""
+        slots = np.unique(slots)
+        if not len(slots): return 0
+        runs = np.split(slots, np.flatnonzero(np.diff(slots) != 1) + 1)
+        if len(runs) > max_runs: runs = [np.arange(slots[0], slots[-1] + 1)]
+        row_bytes = INSTANCE_STRIDE * 4
+        uploaded = 0
+        for run in runs:
+            data = np.ascontiguousarray(self.instance_data[run[0]:run[-1] + 1])
+            glBufferSubData(GL_ARRAY_BUFFER, int(run[0]) * row_bytes, data.nbytes, data)
+            uploaded += data.nbytes
+        return uploaded
+
+    def _dirty_mesh_chunks(self, changed):
+        """變動格子所在的網格區塊；位於區塊邊緣的格子也會影響相鄰區塊的外露面"""
+        cells = np.stack(np.unravel_index(changed, self.volume.shape), axis=1)
+        keys = [cells // MESH_CHUNK]
+        for axis in range(3):
+            for edge, step in ((0, -1), (MESH_CHUNK - 1, 1)):
+                neighbors = cells[cells[:, axis] % MESH_CHUNK == edge] // MESH_CHUNK
+                neighbors[:, axis] += step
+                keys.append(neighbors)
+        keys = np.unique(np.concatenate(keys), axis=0)
+        limit = (np.array(self.volume.shape) - 1) // MESH_CHUNK
+        keys = keys[((keys >= 0) & (keys <= limit)).all(axis=1)]
+        return [tuple(k) for k in keys.tolist()]
+
+    @staticmethod
+    def _delete_mesh_buffers(buffers):
+        """'culled' 模式下 'line' 與 'fill' 共用同一個 VBO，先去除重複再刪除，數量必須與陣列長度一致"""
+        ids = sorted({vbo for vbo, _ in buffers.values()})
+        glDeleteBuffers(len(ids), ids)
+
+    def _update_mesh(self, changed):
+        """
+        介於 _update_voxel_cache 與 GL 上傳之間的網格化階段：剔除與實心鄰格共用的面。
+        外框線固定使用逐格的剔除結果，greedy 合併只用於填色，外觀與逐方塊繪製相同。
+        建造動畫與剖面檢視需要逐方塊判斷可見性，改由實例化路徑（或不支援時的方塊 VBO）繪製。
+        網格以 MESH_CHUNK³ 分塊，changed 為變動格子的平面索引；None 表示全部重建。
+        回傳上傳的位元組數。
+        """
+        if changed is None:
+            for buffers in self.mesh_chunks.values(): self._delete_mesh_buffers(buffers)
+            self.mesh_chunks = {}
+            if self.mesh_mode == 'cubes' or not self.volume.any(): return 0
+            dirty = exposed_chunks(self.volume, MESH_CHUNK)  # 區塊很小、數量多，只重建有外露面的區塊
+        else:
+            if self.mesh_mode == 'cubes' or not len(changed): return 0
+            dirty = self._dirty_mesh_chunks(changed)
+        uploaded = 0
+        for key in dirty:
+            region = [(k * MESH_CHUNK, min((k + 1) * MESH_CHUNK, n)) for k, n in zip(key, self.volume.shape)]
+            line_data, line_count = build_face_buffer(self.volume, self.half, region=region)
+            buffers = self.mesh_chunks.get(key)
+            if not line_count:
+                if buffers: self._delete_mesh_buffers(buffers); del self.mesh_chunks[key]
+                continue
+            if buffers is None:
+                buffers = self.mesh_chunks[key] = {'line': (int(glGenBuffers(1)), 0)}
+            glBindBuffer(GL_ARRAY_BUFFER, buffers['line'][0])
+            glBufferData(GL_ARRAY_BUFFER, line_data.nbytes, line_data, GL_STATIC_DRAW)
+            buffers['line'] = (buffers['line'][0], line_count)
+            uploaded += line_data.nbytes
+            if self.mesh_mode == 'greedy':
+                fill_data, fill_count = build_face_buffer(self.volume, self.half, greedy=True, region=region)
+                fill_vbo = buffers['fill'][0] if 'fill' in buffers and buffers['fill'][0] != buffers['line'][0] else int(glGenBuffers(1))
+                glBindBuffer(GL_ARRAY_BUFFER, fill_vbo)
+                glBufferData(GL_ARRAY_BUFFER, fill_data.nbytes, fill_data, GL_STATIC_DRAW)
+                buffers['fill'] = (fill_vbo, fill_count)
+                uploaded += fill_data.nbytes
+            else:
+                buffers['fill'] = buffers['line']
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return uploaded
+
+    def _draw_instanced(self):
+        """每個繪製階段（外框線、填色）各只需一次 glDrawArraysInstanced"""
+        count = self.instance_count
+        self.visible_vertex_count = self.vertex_count
+        if not count: return
+        glDisableClientState(GL_VERTEX_ARRAY);glUseProgram(self.shared.voxel_program)
+        # 格子座標都是整數，以 +0.5 作為門檻避免浮點誤差
+        clip = [(cfg['value'] + 0.5) * CELL_SIZE if cfg.get('enabled') else UNLIMITED for cfg in (self.slicing_config.get(axis, {}) for axis in 'xyz')]
+        glUniform3f(self.shared.u_clip, *clip)
+        glUniform1f(self.shared.u_build_radius, (self.tick + 0.5) * CELL_SIZE if self.animation_mode == 'build' else UNLIMITED)
+        glBindBuffer(GL_ARRAY_BUFFER, self.shared.cube_mesh_vbo)
+        for location, offset in ((0, 0), (1, 12)):
+            glEnableVertexAttribArray(location);glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(offset))
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        for location, size, offset in ((2, 4, 0), (3, 3, 16)):
+            glEnableVertexAttribArray(location);glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE * 4, ctypes.c_void_p(offset));glVertexAttribDivisor(location, 1)
+
+        glUniform1f(self.shared.u_lit, 0.0);glLineWidth(1.5);glEnable(GL_POLYGON_OFFSET_LINE);glPolygonOffset(-1.0, -1.0);glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+        glDrawArraysInstanced(GL_QUADS, 0, 24, count)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL);glDisable(GL_POLYGON_OFFSET_LINE);glUniform1f(self.shared.u_lit, 1.0)
+        glDrawArraysInstanced(GL_QUADS, 0, 24, count)
+
+        for location in range(len(VOXEL_ATTRIBUTES)):
+            glVertexAttribDivisor(location, 0);glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0);glUseProgram(0)
+
+    def _mesh_is_usable(self):
+        """建造動畫已全部顯示且沒有啟用剖面時，才能改畫剔除後的網格"""
+        if not self.mesh_chunks: return False
+        if self.animation_mode == 'build' and self.tick < self.max_radius: return False
+        return not any(cfg.get('enabled') and cfg.get('value', self.half) < self.half for cfg in self.slicing_config.values())
+
+    def set_volume(self, volume):
+        """直接套用已求好的 dense volume（例如由 RuleWorkerPool 在背景行程算出的結果）"""
+        self.animation_mode = 'build';self.particles.clear();self.volume = volume;self._update_voxel_cache();self.tick = 0
+        if self.gl_initialized: self.makeCurrent(); self._update_vbo(); self.doneCurrent()
+        self.update();self._schedule_frames()
 
     def set_rule_func(self, func):
-        self.animation_mode = 'build';self.particles.clear();self.rule_func = func;self._update_voxel_cache();self.tick = 0
-        if self.gl_initialized: self._update_vbo()
-        self.update()
+        self.rule_func = func;self.set_volume(evaluate_rule(func, self.half, COLORS))
+
+    def _is_animating(self):
+        if self.animation_mode == 'build': return self.tick < self.max_radius
+        if self.animation_mode == 'celebrate': return len(self.particles) > 0
+        return False
+
+    def _schedule_frames(self):
+        """有動畫要播放時啟動計時器（已在執行則不動）"""
+        if self._is_animating() and not self.anim_timer.isActive(): self.anim_timer.start()
 
     def trigger_completion_animation(self):
         self.visible_vertex_count = self.vertex_count;self.animation_mode = 'celebrate';self.particles.clear()
-        center = np.mean([list(pos) for pos in self.voxels.keys()], axis=0) if self.voxels else [0,0,0]
-        for _ in range(200):
-            vel = [random.uniform(-1.5, 1.5), random.uniform(2.0, 4.0), random.uniform(-1.5, 1.5)]
-            color_id = random.choice(list(COLORS.keys()));self.particles.append({'pos': list(center), 'vel': vel, 'life': 100, 'color': COLORS[color_id]})
+        center = self.voxel_positions.mean(axis=0) if len(self.voxel_positions) else [0,0,0]
+        self.particles.emit(center, 200)
+        self._schedule_frames()
 
     def paintGL(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT);glMatrixMode(GL_MODELVIEW);glLoadIdentity();gluLookAt(0, 0, self.distance, 0, 0, 0, 0, 1, 0);glRotatef(self.angle_x, 1, 0, 0);glRotatef(self.angle_y, 0, 1, 0)
         self._draw_gizmo_frame_and_axes()
         
         if self.vertex_count > 0:
-            glBindBuffer(GL_ARRAY_BUFFER, self.vbo_id)
             stride = (3 + 3 + 3) * 4
             
             def setup_draw(mode, line_width=1.5):
@@ -144,39 +506,75 @@ class VoxelGLWidget(QOpenGLWidget):
                     self.visible_vertex_count = num_drawn_voxels * 24
 
             glEnableClientState(GL_VERTEX_ARRAY)
-            draw_pass('line')
-            draw_pass('fill')
+            if self._mesh_is_usable():
+                for mode in ('line', 'fill'):
+                    for buffers in self.mesh_chunks.values():
+                        mesh_vbo_id, mesh_count = buffers[mode]
+                        glBindBuffer(GL_ARRAY_BUFFER, mesh_vbo_id);setup_draw(mode);glDrawArrays(GL_QUADS, 0, mesh_count)
+                self.visible_vertex_count = self.vertex_count
+            elif self.instancing:
+                self._draw_instanced()
+            else:
+                glBindBuffer(GL_ARRAY_BUFFER, self.vbo_id)
+                draw_pass('line')
+                draw_pass('fill')
             glBindBuffer(GL_ARRAY_BUFFER, 0);glDisableClientState(GL_COLOR_ARRAY);glDisableClientState(GL_NORMAL_ARRAY);glDisableClientState(GL_VERTEX_ARRAY)
 
-        if self.animation_mode == 'celebrate':
-            glDisable(GL_LIGHTING);s = 0.2 / 2.0
-            for p in self.particles:
-                glColor3fv(p['color']);glPushMatrix();glTranslatef(p['pos'][0], p['pos'][1], p['pos'][2])
-                glBegin(GL_QUADS);glVertex3f(-s, -s, s); glVertex3f(s, -s, s); glVertex3f(s, s, s); glVertex3f(-s, s, s);glVertex3f(-s, -s, -s); glVertex3f(-s, s, -s); glVertex3f(s, s, -s); glVertex3f(s, -s, -s);glVertex3f(-s, -s, s); glVertex3f(-s, s, s); glVertex3f(-s, s, -s); glVertex3f(-s, -s, -s);glVertex3f(s, -s, -s); glVertex3f(s, s, -s); glVertex3f(s, s, s); glVertex3f(s, -s, s);glVertex3f(-s, s, s); glVertex3f(s, s, s); glVertex3f(s, s, -s); glVertex3f(-s, s, -s);glVertex3f(-s, -s, s); glVertex3f(-s, -s, -s); glVertex3f(s, -s, -s); glVertex3f(s, -s, s);glEnd()
-                glPopMatrix()
-            glEnable(GL_LIGHTING)
+        if self.animation_mode == 'celebrate' and len(self.particles):
+            self._draw_particles()
         self._draw_gizmo_hud_labels()
 
+    def _draw_particles(self):
+        """每幀把所有粒子寫進同一個動態 VBO，一次 glDrawArrays 畫完"""
+        vbo_data = self.particles.build_buffer();stride = PARTICLE_STRIDE * 4
+        glDisable(GL_LIGHTING);glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        glBindBuffer(GL_ARRAY_BUFFER, self.particle_vbo);glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STREAM_DRAW)
+        glEnableClientState(GL_VERTEX_ARRAY);glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, None);glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+        glDrawArrays(GL_QUADS, 0, len(vbo_data) // PARTICLE_STRIDE)
+        glDisableClientState(GL_COLOR_ARRAY);glDisableClientState(GL_VERTEX_ARRAY);glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glEnable(GL_LIGHTING)
+
     def _on_tick(self):
         if self.animation_mode == 'build':
-            max_tick = (HALF * 3) + 3
-            if self.tick < max_tick: self.tick += 1
+            # 超過最遠方塊的曼哈頓距離後畫面不再變化，不必繼續推進
+            if self.tick < self.max_radius: self.tick += 1
         elif self.animation_mode == 'celebrate':
-            for i in range(len(self.particles) - 1, -1, -1):
-                p = self.particles[i];p['pos'][0] += p['vel'][0] * 0.1;p['pos'][1] += p['vel'][1] * 0.1;p['pos'][2] += p['vel'][2] * 0.1;p['vel'][1] -= 0.1;p['life'] -= 1
-                if p['life'] <= 0: self.particles.pop(i)
+            self.particles.step()
         self.update()
+        if not self._is_animating(): self.anim_timer.stop()
+
+    def _gizmo_labels(self, axis_to_hide, front_x_sign, front_y_sign, front_z_sign):
+        """各座標軸的刻度數字與軸名稱，位於最靠近相機的那條邊上；正對相機的那一軸不顯示"""
+        s_num = (self.half + 1.2) * (CELL_SIZE + 0.18); label_offset = (self.half + 2.2) * (CELL_SIZE + 0.18); spacing = 1.0; ticks = [i for i in range(-self.half, self.half + 1) if i != 0]; labels = []
+        if axis_to_hide != 'y': color = (0.4, 1.0, 0.4); labels += [((s_num*front_x_sign, i*spacing-0.3, s_num*front_z_sign), str(i), color) for i in ticks] + [((s_num*front_x_sign, label_offset, s_num*front_z_sign), "Y", color)]
+        if axis_to_hide != 'x': color = (1.0, 0.4, 0.4); labels += [((i*spacing-0.3, s_num*front_y_sign, s_num*front_z_sign), str(i), color) for i in ticks] + [((label_offset, s_num*front_y_sign, s_num*front_z_sign), "X", color)]
+        if axis_to_hide != 'z': color = (0.4, 0.7, 1.0); labels += [((s_num*front_x_sign, s_num*front_y_sign, i*spacing-0.3), str(i), color) for i in ticks] + [((s_num*front_x_sign, s_num*front_y_sign, label_offset), "Z", color)]
+        return labels
 
     def _draw_gizmo_hud_labels(self):
-        glDisable(GL_LIGHTING); s_num = (HALF + 1.2) * (CELL_SIZE + 0.18); label_offset = (HALF + 2.2) * (CELL_SIZE + 0.18); spacing = 1.0; rad_ax = math.radians(self.angle_x); rad_ay = math.radians(self.angle_y); cam_x = -math.sin(rad_ay)*math.cos(rad_ax); cam_y = math.sin(rad_ax); cam_z = math.cos(rad_ay)*math.cos(rad_ax); front_x_sign = 1 if cam_x >= 0 else -1; front_y_sign = 1 if cam_y >= 0 else -1; front_z_sign = 1 if cam_z >= 0 else -1; abs_cam_vals = {'x': abs(cam_x), 'y': abs(cam_y), 'z': abs(cam_z)}; axis_to_hide = max(abs_cam_vals, key=abs_cam_vals.get)
-        def draw_text(x, y, z, text): glRasterPos3f(x, y, z); [glut.glutBitmapCharacter(glut.GLUT_BITMAP_HELVETICA_18, ord(char)) for char in text]
-        if axis_to_hide != 'y': glColor3f(0.4, 1.0, 0.4); [draw_text(s_num*front_x_sign, i*spacing-0.3, s_num*front_z_sign, str(i)) for i in range(-HALF, HALF + 1) if i != 0]; draw_text(s_num*front_x_sign, label_offset, s_num*front_z_sign, "Y")
-        if axis_to_hide != 'x': glColor3f(1.0, 0.4, 0.4); [draw_text(i*spacing-0.3, s_num*front_y_sign, s_num*front_z_sign, str(i)) for i in range(-HALF, HALF + 1) if i != 0]; draw_text(label_offset, s_num*front_y_sign, s_num*front_z_sign, "X")
-        if axis_to_hide != 'z': glColor3f(0.4, 0.7, 1.0); [draw_text(s_num*front_x_sign, s_num*front_y_sign, i*spacing-0.3, str(i)) for i in range(-HALF, HALF + 1) if i != 0]; draw_text(s_num*front_x_sign, s_num*front_y_sign, label_offset, "Z")
-        glEnable(GL_LIGHTING)
+        shared = self.shared
+        if shared.label_program is None: return
+        rad_ax = math.radians(self.angle_x); rad_ay = math.radians(self.angle_y); cam_x = -math.sin(rad_ay)*math.cos(rad_ax); cam_y = math.sin(rad_ax); cam_z = math.cos(rad_ay)*math.cos(rad_ax); abs_cam_vals = {'x': abs(cam_x), 'y': abs(cam_y), 'z': abs(cam_z)}
+        key = (self.half, max(abs_cam_vals, key=abs_cam_vals.get), 1 if cam_x >= 0 else -1, 1 if cam_y >= 0 else -1, 1 if cam_z >= 0 else -1)
+        label_vbo, label_vertex_count = shared.label_buffer(key, lambda: self._gizmo_labels(*key[1:]))
+        glUseProgram(shared.label_program);glUniform2f(shared.u_viewport, *self.viewport);glUniform1i(shared.u_atlas, 0)
+        glActiveTexture(GL_TEXTURE0);glBindTexture(GL_TEXTURE_2D, shared.label_texture);glEnable(GL_BLEND);glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glBindBuffer(GL_ARRAY_BUFFER, label_vbo);stride = LABEL_STRIDE * 4
+        for location, size, offset in ((0, 3, 0), (1, 2, 3), (2, 2, 5), (3, 3, 7)):
+            glEnableVertexAttribArray(location);glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset * 4))
+        glDrawArrays(GL_QUADS, 0, label_vertex_count)
+        for location in range(4): glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0);glBindTexture(GL_TEXTURE_2D, 0);glDisable(GL_BLEND);glUseProgram(0)
     def _draw_gizmo_frame_and_axes(self):
-        glDisable(GL_LIGHTING); s = (HALF + 0.5) * (CELL_SIZE + 0.18); glLineWidth(2.0); glColor4f(0.8, 0.8, 0.8, 0.7); glBegin(GL_LINE_LOOP); glVertex3f(-s,-s,s); glVertex3f(s,-s,s); glVertex3f(s,s,s); glVertex3f(-s,s,s); glEnd(); glBegin(GL_LINE_LOOP); glVertex3f(-s,-s,-s); glVertex3f(s,-s,-s); glVertex3f(s,s,-s); glVertex3f(-s,s,-s); glEnd(); glBegin(GL_LINES); glVertex3f(-s,-s,s); glVertex3f(-s,-s,-s); glVertex3f(s,-s,s); glVertex3f(s,-s,-s); glVertex3f(s,s,s); glVertex3f(s,s,-s); glVertex3f(-s,s,s); glVertex3f(-s,s,-s); glEnd(); s_axis = (HALF + 1.0) * (CELL_SIZE + 0.18); arrow_radius, arrow_height = 0.25, 0.8; glLineWidth(3.5); glColor3f(1.0, 0.2, 0.2); glBegin(GL_LINES); glVertex3f(-s_axis,0,0); glVertex3f(s_axis,0,0); glEnd(); glPushMatrix(); glTranslatef(s_axis,0,0); glRotatef(90,0,1,0); gluCylinder(self.quadric,arrow_radius,0,arrow_height,15,1); glPopMatrix(); glColor3f(0.2, 1.0, 0.2); glBegin(GL_LINES); glVertex3f(0,-s_axis,0); glVertex3f(0,s_axis,0); glEnd(); glPushMatrix(); glTranslatef(0,s_axis,0); glRotatef(-90,1,0,0); gluCylinder(self.quadric,arrow_radius,0,arrow_height,15,1); glPopMatrix(); glColor3f(0.2, 0.6, 1.0); glBegin(GL_LINES); glVertex3f(0,0,-s_axis); glVertex3f(0,0,s_axis); glEnd(); glPushMatrix(); glTranslatef(0,0,s_axis); gluCylinder(self.quadric,arrow_radius,0,arrow_height,15,1); glPopMatrix(); glEnable(GL_LIGHTING)
-    def resizeGL(self, w, h): glViewport(0, 0, w, max(1, h));glMatrixMode(GL_PROJECTION);glLoadIdentity();gluPerspective(45.0, w / max(1.0, float(h)), 0.1, 1000.0);glMatrixMode(GL_MODELVIEW)
+        gizmo_vbo, ranges = self.shared.gizmo_buffer(self.half);glBindBuffer(GL_ARRAY_BUFFER, gizmo_vbo)
+        stride = GIZMO_STRIDE * 4;glDisable(GL_LIGHTING);glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        glEnableClientState(GL_VERTEX_ARRAY);glEnableClientState(GL_COLOR_ARRAY);glVertexPointer(3, GL_FLOAT, stride, None);glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+        glLineWidth(2.0);glDrawArrays(GL_LINES, *ranges['frame'])
+        glLineWidth(3.5);glDrawArrays(GL_LINES, *ranges['axes'])
+        glDrawArrays(GL_TRIANGLES, *ranges['arrows'])
+        glDisableClientState(GL_COLOR_ARRAY);glDisableClientState(GL_VERTEX_ARRAY);glBindBuffer(GL_ARRAY_BUFFER, 0);glEnable(GL_LIGHTING)
+    def resizeGL(self, w, h): self.viewport = (max(1, w), max(1, h));glViewport(0, 0, w, max(1, h));glMatrixMode(GL_PROJECTION);glLoadIdentity();gluPerspective(45.0, w / max(1.0, float(h)), 0.1, 1000.0);glMatrixMode(GL_MODELVIEW)
     def mousePressEvent(self, e): self.last_mouse = (e.x(), e.y())
     def mouseMoveEvent(self, e):
         if self.last_mouse is None or not(e.buttons() & Qt.LeftButton): return
@@ -187,22 +585,50 @@ class VoxelGLWidget(QOpenGLWidget):
 
 
 class TargetPreviewWidget(VoxelGLWidget):
+    """
+    目標預覽：與遊戲視窗共用著色器與外框等 GL 資源，方塊直接由關卡的方塊清單上傳成實例資料，
+    不建立 dense volume，也不做網格化（預覽只是顯示，不需要差異比對或剔除）。
+    """
     def __init__(self, parent=None):
         super().__init__(parent)
         # 【核心修正】為預覽圖設定一個獨立的模式，以避免觸發動畫
         self.animation_mode = 'idle' 
 
-    def set_rule_func(self, func):
-        # 【核心修正】此函式不能呼叫父類別的 set_rule_func，以免 animation_mode 被重設
-        self.rule_func = func
-        self._update_voxel_cache()
+    def set_blocks(self, positions, colors):
+        """positions 為 (N, 3) 的格子座標，colors 為 (N,) 的顏色編號（例如 ChunkedVoxelStore.to_arrays() 的結果）"""
+        self.voxel_positions = np.asarray(positions, dtype=np.int32).reshape(-1, 3)
+        self.voxel_colors = np.asarray(colors, dtype=np.int8).reshape(-1)
+        self.max_radius = int(np.abs(self.voxel_positions).sum(axis=1).max()) if len(self.voxel_positions) else 0
         if self.gl_initialized:
-            self._update_vbo()
+            self.makeCurrent(); self._update_vbo(); self.doneCurrent()
         self.visible_vertex_count = self.vertex_count
         self.update()
 
+    def set_volume(self, volume):
+        # 【核心修正】此函式不能呼叫父類別的 set_volume，以免 animation_mode 被重設
+        positions = np.argwhere(volume)
+        self.set_blocks(positions - self.half, volume[tuple(positions.T)])
+
+    def _update_vbo(self):
+        if not self.gl_initialized: return
+        self.vertex_count = len(self.voxel_positions) * 24
+        if self.instancing:
+            self.instance_data = instance_rows(self.voxel_positions, self.voxel_colors);self.instance_count = len(self.instance_data)
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.instance_data.nbytes, self.instance_data, GL_STATIC_DRAW)
+        else:
+            self.sorted_voxel_keys = [tuple(p) for p in self.voxel_positions.tolist()]
+            vbo_data = build_cube_buffer(self.voxel_positions, self.voxel_colors)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo_id)
+            glBufferData(GL_ARRAY_BUFFER, vbo_data.nbytes, vbo_data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def set_rule_func(self, func):
+        self.rule_func = func
+        self.set_volume(evaluate_rule(func, self.half, COLORS))
+
     def _on_tick(self):
-        pass
+        self.anim_timer.stop()
 
     def trigger_completion_animation(self):
         pass
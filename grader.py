@@ -0,0 +1,251 @@
+# grader.py
+"""
+大量批改：把 (level_id, code) 提交分派到多個獨立的工作行程，每個工作有時間與記憶體上限，
+結果以 JSONL 逐筆輸出，結束時在 stderr 印出吞吐量、每筆求值時間的 p50 / p99 與失敗原因統計。
+
+    python grader.py submissions.jsonl [--levels levels] [--workers N] [--timeout 2] [--load-timeout 30] [--memory-mb 512] [-o results.jsonl]
+    python grader.py submissions_dir/ ...
+    cat submissions.jsonl | python grader.py - ...
+
+JSONL 每行為 {"id": 任意識別字串 (可省略), "level_id": "...", "code": "..."}，無法解析的行記為 bad_input 後繼續
+（bad_input 與 unknown_level 只計入失敗原因，不算進批改筆數與時間統計）；
+逾時從工作行程載入關卡之後才開始計算，載入本身另有 --load-timeout 的上限；
+目錄模式下每個 .py 檔是一筆提交，檔名 (不含副檔名) 為 level_id，id 為相對路徑。
+
+注意：這不是沙箱。提交的程式碼與遊戲中一樣以完整的 builtins 執行（可以 open、__import__），
+工作行程只有 rlimit、逾時、丟棄輸出（stdout / stderr 導向 devnull）與獨立的暫存工作目錄這些限制；
+批改不受信任的提交時，請在容器或權限受限的帳號下執行。
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, OrderedDict
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from level_index import scan_levels
+from level_io import load_level
+from verify import verify_solution
+
+LEVEL_CACHE_SIZE = 32  # 每個工作行程保留的已載入關卡數
+
+
+def _apply_memory_limit(memory_mb):
+    """以 rlimit 限制工作行程的位址空間（非 Unix 平台沒有 resource 模組，只能靠逾時保護）"""
+    try:
+        import resource
+    except ImportError:
+        return
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _apply_cpu_limit(cpu_seconds):
+    """
+    RLIMIT_CPU 計算的是行程從啟動以來累積的 CPU 時間，而不是單一工作的時間，
+    所以每個工作開始前都要以「已使用的時間 + 本次的額度」重新設定軟上限（硬上限維持不變，之後才能再調高）。
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + 1 + cpu_seconds
+    if hard != resource.RLIM_INFINITY: soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _grade_worker(conn, memory_mb, cpu_seconds, workdir):
+    """工作行程主迴圈：接收 (job_index, level_path, code)，關卡載入後先回傳 (job_index, None)，批改完再回傳 (job_index, result)"""
+    # 提交中的 print 不能混進結果（stdout 可能就是 JSONL 輸出），相對路徑的檔案操作也只落在暫存目錄
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1); os.dup2(devnull, 2); os.close(devnull)
+    os.chdir(workdir)
+    _apply_memory_limit(memory_mb)
+    conn.send(None)  # 通知主行程已啟動完畢，逾時從實際開始批改時才計算
+    levels = OrderedDict()  # 關卡路徑 -> load_level 結果 (LRU)
+    while True:
+        try: msg = conn.recv()
+        except EOFError: break
+        if msg is None: break
+        job_index, level_path, code = msg
+        try:
+            level = levels.pop(level_path, None) or load_level(level_path)
+            levels[level_path] = level
+            if len(levels) > LEVEL_CACHE_SIZE: levels.popitem(last=False)
+            conn.send((job_index, None))  # 關卡已載入：主行程從這裡開始計算逾時，CPU 額度也從這裡重新計算
+            if cpu_seconds: _apply_cpu_limit(cpu_seconds)
+            result = verify_solution(level, code)
+            reason = "ok" if result["passed"] else ("error" if result["error"] else "wrong_answer")
+        except MemoryError:
+            levels.clear()
+            result, reason = {"passed": False, "score": 0, "error": "超過記憶體上限", "timing": {}}, "memory"
+        except Exception as e:
+            result, reason = {"passed": False, "score": 0, "error": f"{type(e).__name__}: {e}", "timing": {}}, "error"
+        conn.send((job_index, dict(result, reason=reason)))
+
+
+class _GradeWorker:
+    def __init__(self, ctx, memory_mb, cpu_seconds, workdir):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_grade_worker, args=(child_conn, memory_mb, cpu_seconds, workdir), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.job = None  # [job_index, submission, sent_at, started_at]；started_at 在關卡載入完成前為 None
+
+    def kill(self):
+        if self.process.is_alive(): self.process.kill()
+        self.process.join(0.5)
+        self.conn.close()
+
+
+def read_submissions(source):
+    """逐筆產生 {"id", "level_id", "code"}；source 為 JSONL 檔、目錄或 "-" (stdin)。無法解析的行產生 {"id", "bad_input": 錯誤訊息}"""
+    if source != "-" and os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in sorted(files):
+                if not filename.endswith(".py"): continue
+                path = os.path.join(root, filename)
+                with open(path, "r", encoding="utf-8") as f:
+                    yield {"id": os.path.relpath(path, source), "level_id": os.path.splitext(filename)[0], "code": f.read()}
+        return
+    stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    try:
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip(): continue
+            try:
+                submission = json.loads(line)
+                if not isinstance(submission, dict): raise ValueError("每行必須是 JSON 物件")
+            except ValueError as e:
+                yield {"id": str(line_no), "bad_input": f"第 {line_no} 行無法解析: {e}"}
+                continue
+            submission.setdefault("id", str(line_no))
+            yield submission
+    finally:
+        if stream is not sys.stdin: stream.close()
+
+
+def grade(submissions, level_paths, out, workers=None, timeout=2.0, memory_mb=512, load_timeout=30.0):
+    """
+    批改所有提交並把結果逐筆寫入 out（JSONL，依完成順序）。
+    timeout 從工作行程載入關卡之後才開始計算；載入關卡（第一次或被 LRU 淘汰後）另以 load_timeout 為上限。
+    逾時或記憶體不足而被終止的工作行程會立即換成新的行程。回傳統計資料 dict；
+    count、throughput 與 p50 / p99 只計算實際送進工作行程的提交，沒送出的 bad_input / unknown_level 只出現在 reasons。
+    """
+    ctx = mp.get_context("spawn")
+    cpu_seconds = int(timeout) + 2  # CPU 上限只是逾時之外的保險
+    workdir = tempfile.TemporaryDirectory(prefix="grader-")
+    level_paths = {level_id: os.path.abspath(path) for level_id, path in level_paths.items()}  # 工作行程的工作目錄不同
+    pool = [_GradeWorker(ctx, memory_mb, cpu_seconds, workdir.name) for _ in range(workers or os.cpu_count() or 1)]
+    submissions = iter(submissions)
+    elapsed_times, reasons = [], Counter()
+    started, next_index, exhausted = time.perf_counter(), 0, False
+
+    def emit(submission, result, elapsed=None):
+        """elapsed 為 None 代表提交沒有送進工作行程（bad_input / unknown_level），不列入時間統計"""
+        reasons[result["reason"]] += 1
+        if elapsed is not None: elapsed_times.append(elapsed)
+        out.write(json.dumps({"id": submission.get("id"), "level_id": submission.get("level_id"), "passed": result["passed"],
+                              "score": result["score"], "reason": result["reason"], "error": result["error"],
+                              "mismatch": result.get("mismatch"), "elapsed": None if elapsed is None else round(elapsed, 6)},
+                             ensure_ascii=False) + "\n")
+
+    try:
+        while True:
+            # 把新提交分派給閒置的行程；找不到關卡的提交直接記為失敗
+            for worker in pool:
+                while worker.ready and worker.job is None and not exhausted:
+                    submission = next(submissions, None)
+                    if submission is None: exhausted = True; break
+                    if "bad_input" in submission:
+                        emit(submission, {"passed": False, "score": 0, "reason": "bad_input", "error": submission["bad_input"]})
+                        continue
+                    level_path = level_paths.get(submission.get("level_id"))
+                    if level_path is None:
+                        emit(submission, {"passed": False, "score": 0, "reason": "unknown_level", "error": f"找不到關卡 {submission.get('level_id')}"})
+                        continue
+                    worker.conn.send((next_index, level_path, submission.get("code", "")))
+                    worker.job = [next_index, submission, time.perf_counter(), None]; next_index += 1
+            busy = [w for w in pool if w.job is not None]
+            if not busy and exhausted: break
+            starting = [w for w in pool if not w.ready]
+            deadline = min(w.job[2] + load_timeout if w.job[3] is None else w.job[3] + timeout for w in busy) if busy else None
+            ready = wait([w.conn for w in busy + starting] + [w.process.sentinel for w in busy + starting],
+                         None if deadline is None else max(0.0, deadline - time.perf_counter()))
+            now = time.perf_counter()
+            for i, worker in enumerate(pool):
+                if not worker.ready:
+                    if worker.conn in ready:
+                        worker.conn.recv(); worker.ready = True
+                    elif worker.process.sentinel in ready:
+                        raise RuntimeError(f"工作行程無法啟動 (exit code {worker.process.exitcode})")
+                    continue
+                if worker.job is None: continue
+                _, submission, sent_at, job_started = worker.job
+                result = None
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    try:
+                        _, result = worker.conn.recv()
+                        if result is None: worker.job[3] = time.perf_counter(); continue  # 關卡載入完成，開始計時
+                    except (EOFError, OSError):
+                        # 行程被 rlimit 或作業系統終止
+                        worker.process.join(0.5)
+                        result = {"passed": False, "score": 0, "reason": "crashed", "error": f"工作行程意外結束 (exit code {worker.process.exitcode})"}
+                elif job_started is None and now - sent_at > load_timeout:
+                    result = {"passed": False, "score": 0, "reason": "timeout", "error": f"載入關卡超過 {load_timeout:g} 秒"}
+                elif job_started is not None and now - job_started > timeout:
+                    result = {"passed": False, "score": 0, "reason": "timeout", "error": f"執行超過 {timeout:g} 秒"}
+                if result is None: continue
+                emit(submission, result, now - (sent_at if job_started is None else job_started))
+                if result["reason"] in ("crashed", "timeout"):
+                    worker.kill(); pool[i] = _GradeWorker(ctx, memory_mb, cpu_seconds, workdir.name)
+                else:
+                    worker.job = None
+            out.flush()
+    finally:
+        for worker in pool:
+            try: worker.conn.send(None)
+            except (OSError, ValueError): pass
+            worker.kill()
+        workdir.cleanup()
+
+    total = time.perf_counter() - started
+    times = np.array(elapsed_times) if elapsed_times else np.zeros(1)
+    return {"count": len(elapsed_times), "seconds": total, "throughput": len(elapsed_times) / total if total else 0.0,
+            "p50": float(np.percentile(times, 50)), "p99": float(np.percentile(times, 99)), "reasons": dict(reasons)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="JSONL 檔、提交目錄，或 - 代表 stdin")
+    parser.add_argument("--levels", default="levels", help="關卡目錄")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=2.0, help="每筆提交的時間上限（秒）")
+    parser.add_argument("--load-timeout", type=float, default=30.0, help="工作行程載入一個關卡的時間上限（秒），不計入 --timeout")
+    parser.add_argument("--memory-mb", type=int, default=512, help="每個工作行程的記憶體上限，0 表示不限制")
+    parser.add_argument("-o", "--output", help="結果輸出檔（預設為 stdout）")
+    args = parser.parse_args(argv)
+
+    level_paths = {level["id"]: level["path"] for level in scan_levels(args.levels)}
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        stats = grade(read_submissions(args.source), level_paths, out, args.workers, args.timeout, args.memory_mb, args.load_timeout)
+    finally:
+        if out is not sys.stdout: out.close()
+    print(f"{stats['count']} 筆，{stats['seconds']:.2f} 秒，{stats['throughput']:.1f} 筆/秒；"
+          f"p50 {stats['p50'] * 1000:.1f}ms  p99 {stats['p99'] * 1000:.1f}ms", file=sys.stderr)
+    print("結果: " + "  ".join(f"{reason} {count}" for reason, count in sorted(stats["reasons"].items())), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    sys.exit(main())
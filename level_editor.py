@@ -1,14 +1,16 @@
 # level_editor.py
-import sys, os, json
+import sys
 from PyQt5.QtWidgets import (
     QApplication, QDialog, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-    QSlider, QPushButton, QLineEdit, QMessageBox
+    QSlider, QPushButton, QLineEdit, QMessageBox, QSpinBox
 )
 from PyQt5.QtCore import Qt, QPoint, QRect
-from PyQt5.QtGui import QPainter, QColor, QPen, QBrush
+from PyQt5.QtGui import QPainter, QColor, QPen, QPixmap
 
 # 從主遊戲引擎引入顏色定義
-from engine3d import COLORS, HALF
+from engine3d import COLORS
+from level_io import DEFAULT_GRID_SIZE, save_level, next_level_path
+from voxel_store import ChunkedVoxelStore
 
 class EditorGridWidget(QWidget):
     """核心的網格編輯區"""
@@ -17,11 +19,13 @@ class EditorGridWidget(QWidget):
         self.setMinimumSize(400, 400)
         self.setMouseTracking(True) # 啟用滑鼠追蹤以實現拖曳繪製
         
-        self.grid_range = range(-HALF, HALF + 1)
-        self.cell_size = 0
-        self.blocks = {}  # {(x, y, z): color_id}
+        self.grid_range = range(-(DEFAULT_GRID_SIZE // 2), DEFAULT_GRID_SIZE // 2 + 1)
+        self.layers = {}  # {y: {(x, z): color_id}}，繪製時只需要查目前這一層
         self.current_y = 0
         self.current_color = 1
+        self.colors = {color_id: QColor(*[int(c * 255) for c in rgb]) for color_id, rgb in COLORS.items()}
+        self.grid_pixmap = None  # 網格線的快取，視窗大小或格數改變時才重畫
+        self._update_geometry()
 
     def set_layer(self, y_layer):
         self.current_y = y_layer
@@ -30,18 +34,41 @@ class EditorGridWidget(QWidget):
     def set_color(self, color_id):
         self.current_color = color_id
 
+    def set_grid_size(self, size):
+        """變更網格大小；超出新範圍的方塊只是暫時不顯示，放大回來時仍在，儲存時才會被裁掉"""
+        half = size // 2
+        self.grid_range = range(-half, half + 1)
+        self._update_geometry()
+        self.update()
+
     def get_blocks_data(self):
-        return self.blocks
+        """目前網格範圍內的方塊 {(x, y, z): color_id}"""
+        r = self.grid_range
+        return {(x, y, z): cid for y, cells in self.layers.items() if y in r for (x, z), cid in cells.items() if x in r and z in r}
+
+    def _update_geometry(self):
+        """依視窗大小與格數計算格子大小與置中偏移，並讓網格線快取失效"""
+        grid_len = len(self.grid_range)
+        self.cell_size = min(self.width(), self.height()) * 0.9 / grid_len
+        self.offset_x = (self.width() - self.cell_size * grid_len) / 2
+        self.offset_z = (self.height() - self.cell_size * grid_len) / 2
+        self.grid_pixmap = None
+
+    def resizeEvent(self, event):
+        self._update_geometry()
+        super().resizeEvent(event)
+
+    def _cell_rect(self, x, z):
+        draw_x = (x - min(self.grid_range)) * self.cell_size + self.offset_x
+        draw_z = (z - min(self.grid_range)) * self.cell_size + self.offset_z
+        return QRect(int(draw_x), int(draw_z), int(self.cell_size), int(self.cell_size))
 
     def _get_grid_pos(self, mouse_pos):
         """將像素座標轉換為網格座標 (x, z)"""
         if self.cell_size == 0: return None
         
-        offset_x = (self.width() - self.cell_size * len(self.grid_range)) / 2
-        offset_z = (self.height() - self.cell_size * len(self.grid_range)) / 2
-        
-        grid_x = int((mouse_pos.x() - offset_x) / self.cell_size) + min(self.grid_range)
-        grid_z = int((mouse_pos.y() - offset_z) / self.cell_size) + min(self.grid_range)
+        grid_x = int((mouse_pos.x() - self.offset_x) / self.cell_size) + min(self.grid_range)
+        grid_z = int((mouse_pos.y() - self.offset_z) / self.cell_size) + min(self.grid_range)
 
         if grid_x in self.grid_range and grid_z in self.grid_range:
             return grid_x, grid_z
@@ -51,17 +78,17 @@ class EditorGridWidget(QWidget):
         pos = self._get_grid_pos(event.pos())
         if not pos: return
 
-        x, z = pos
-        coord = (x, self.current_y, z)
-
+        cells = self.layers.setdefault(self.current_y, {})
         if event.buttons() & Qt.LeftButton:
-            if self.blocks.get(coord) != self.current_color:
-                self.blocks[coord] = self.current_color
-                self.update()
+            if cells.get(pos) == self.current_color: return
+            cells[pos] = self.current_color
         elif event.buttons() & Qt.RightButton:
-            if coord in self.blocks:
-                del self.blocks[coord]
-                self.update()
+            if pos not in cells: return
+            del cells[pos]
+        else:
+            return
+        # 只重繪這一格（多留 1 像素給格線的取整誤差），拖曳繪製時不必重畫整個網格
+        self.update(self._cell_rect(*pos).adjusted(-1, -1, 2, 2))
 
     def mousePressEvent(self, event):
         self._handle_mouse_event(event)
@@ -69,36 +96,50 @@ class EditorGridWidget(QWidget):
     def mouseMoveEvent(self, event):
         self._handle_mouse_event(event)
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.fillRect(self.rect(), QColor("#2E3440")) # 背景色
-
+    def _render_grid(self):
+        """把所有網格線畫進透明的 QPixmap（依螢幕的 devicePixelRatio 建立，避免高解析度螢幕上模糊）"""
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(int(self.width() * ratio), int(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
         grid_len = len(self.grid_range)
-        self.cell_size = min(self.width(), self.height()) * 0.9 / grid_len
-        
-        offset_x = (self.width() - self.cell_size * grid_len) / 2
-        offset_z = (self.height() - self.cell_size * grid_len) / 2
-
-        # 繪製方塊
-        for (x, y, z), color_id in self.blocks.items():
-            if y == self.current_y:
-                draw_x = (x - min(self.grid_range)) * self.cell_size + offset_x
-                draw_z = (z - min(self.grid_range)) * self.cell_size + offset_z
-                
-                r, g, b = [int(c * 255) for c in COLORS.get(color_id, (0,0,0))]
-                painter.setBrush(QBrush(QColor(r, g, b)))
-                painter.setPen(Qt.NoPen)
-                painter.drawRect(int(draw_x), int(draw_z), int(self.cell_size), int(self.cell_size))
-
-        # 繪製網格線
         painter.setPen(QPen(QColor("#4C566A"), 1))
         for i in range(grid_len + 1):
             # 垂直線
-            x_pos = offset_x + i * self.cell_size
-            painter.drawLine(QPoint(int(x_pos), int(offset_z)), QPoint(int(x_pos), int(offset_z + grid_len * self.cell_size)))
+            x_pos = self.offset_x + i * self.cell_size
+            painter.drawLine(QPoint(int(x_pos), int(self.offset_z)), QPoint(int(x_pos), int(self.offset_z + grid_len * self.cell_size)))
             # 水平線
-            z_pos = offset_z + i * self.cell_size
-            painter.drawLine(QPoint(int(offset_x), int(z_pos)), QPoint(int(offset_x + grid_len * self.cell_size), int(z_pos)))
+            z_pos = self.offset_z + i * self.cell_size
+            painter.drawLine(QPoint(int(self.offset_x), int(z_pos)), QPoint(int(self.offset_x + grid_len * self.cell_size), int(z_pos)))
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        dirty = event.rect()
+        painter.fillRect(dirty, QColor("#2E3440")) # 背景色
+        if self.cell_size == 0: return
+
+        # 繪製方塊：重繪區域小（例如筆刷的一格）時逐格查詢目前圖層，區域大時直接走訪這一層的方塊
+        cells = self.layers.get(self.current_y, {})
+        grid_len = len(self.grid_range)
+        # 格子的像素位置經過取整，範圍向外多取一格，是否真的重疊交給下面的 intersects 判斷
+        col_lo = max(0, int((dirty.left() - self.offset_x) / self.cell_size) - 1); col_hi = min(grid_len - 1, int((dirty.right() - self.offset_x) / self.cell_size) + 1)
+        row_lo = max(0, int((dirty.top() - self.offset_z) / self.cell_size) - 1); row_hi = min(grid_len - 1, int((dirty.bottom() - self.offset_z) / self.cell_size) + 1)
+        if (col_hi - col_lo + 1) * (row_hi - row_lo + 1) < len(cells):
+            lo = min(self.grid_range)
+            visible = ((pos, cells.get(pos)) for pos in ((lo + col, lo + row) for col in range(col_lo, col_hi + 1) for row in range(row_lo, row_hi + 1)))
+        else:
+            visible = cells.items()
+        for (x, z), color_id in visible:
+            if color_id is None or x not in self.grid_range or z not in self.grid_range: continue  # 縮小網格後留在範圍外的方塊
+            rect = self._cell_rect(x, z)
+            if rect.intersects(dirty): painter.fillRect(rect, self.colors.get(color_id, Qt.black))
+
+        # 繪製網格線：貼上快取的 QPixmap，繪製範圍由 Qt 裁切到重繪區域
+        if self.grid_pixmap is None: self.grid_pixmap = self._render_grid()
+        painter.drawPixmap(0, 0, self.grid_pixmap)
 
 class LevelEditorDialog(QDialog):
     """關卡編輯器主視窗"""
@@ -117,7 +158,16 @@ class LevelEditorDialog(QDialog):
         # 1. 網格編輯區
         self.grid_widget = EditorGridWidget()
 
-        # 2. 圖層控制
+        # 2. 網格大小
+        controls_layout.addWidget(QLabel("<b>網格大小</b>"))
+        self.size_spin = QSpinBox()
+        self.size_spin.setRange(3, 65)
+        self.size_spin.setSingleStep(2)
+        self.size_spin.setKeyboardTracking(False)  # 輸入 "33" 時不要先以 3 套用，只在按 Enter 或離開欄位時才變更
+        self.size_spin.setValue(len(self.grid_widget.grid_range))
+        controls_layout.addWidget(self.size_spin)
+
+        # 3. 圖層控制
         controls_layout.addWidget(QLabel("<b>圖層 (Y軸)</b>"))
         layer_control_layout = QHBoxLayout()
         self.layer_slider = QSlider(Qt.Vertical)
@@ -133,7 +183,7 @@ class LevelEditorDialog(QDialog):
         layer_control_layout.addWidget(self.layer_slider)
         controls_layout.addLayout(layer_control_layout)
 
-        # 3. 顏色選擇盤
+        # 4. 顏色選擇盤
         controls_layout.addWidget(QLabel("<b>顏色選擇</b>"))
         palette_layout = QVBoxLayout()
         self.color_buttons = {}
@@ -148,7 +198,7 @@ class LevelEditorDialog(QDialog):
         controls_layout.addLayout(palette_layout)
         self._select_color(1) # 預設選中第一個顏色
 
-        # 4. 關卡資訊和儲存
+        # 5. 關卡資訊和儲存
         controls_layout.addStretch()
         controls_layout.addWidget(QLabel("<b>關卡名稱</b>"))
         self.level_name_input = QLineEdit("我的新關卡")
@@ -160,6 +210,7 @@ class LevelEditorDialog(QDialog):
 
         # 連接信號
         self.layer_slider.valueChanged.connect(self._update_layer)
+        self.size_spin.valueChanged.connect(self._update_grid_size)
         save_button.clicked.connect(self._save_level)
 
         main_layout.addWidget(controls_widget)
@@ -169,6 +220,13 @@ class LevelEditorDialog(QDialog):
         self.layer_label.setText(f"Y = {value}")
         self.grid_widget.set_layer(value)
 
+    def _update_grid_size(self, size):
+        if size % 2 == 0:  # 網格以原點為中心，邊長必須是奇數
+            self.size_spin.setValue(size + 1)
+            return
+        self.grid_widget.set_grid_size(size)
+        self.layer_slider.setRange(min(self.grid_widget.grid_range), max(self.grid_widget.grid_range))
+
     def _select_color(self, color_id):
         self.grid_widget.set_color(color_id)
         # 更新按鈕視覺效果
@@ -189,24 +247,12 @@ class LevelEditorDialog(QDialog):
             QMessageBox.warning(self, "錯誤", "關卡中沒有任何方塊！")
             return
             
-        # 格式化為遊戲可讀的 JSON
-        output_data = {
-            "name": level_name,
-            "blocks": [{"pos": list(pos), "color": cid} for pos, cid in blocks_data.items()]
-        }
-        
-        # 尋找一個不重複的檔案名稱
-        i = 1
-        while True:
-            filename = f"custom_level_{i}.json"
-            filepath = os.path.join("levels", filename)
-            if not os.path.exists(filepath):
-                break
-            i += 1
+        # 格式化為遊戲可讀的 JSON，並尋找一個不重複的檔案名稱
+        store = ChunkedVoxelStore.from_arrays(list(blocks_data.keys()), list(blocks_data.values()))
+        filepath = next_level_path("levels")
             
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            save_level(filepath, level_name, store, len(self.grid_widget.grid_range))
             
             QMessageBox.information(self, "成功", f"關卡已儲存至:\n{filepath}")
             self.accept() # 關閉編輯器視窗
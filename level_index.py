@@ -0,0 +1,82 @@
+# level_index.py
+"""
+關卡清單的磁碟快取：以 (路徑, mtime, 檔案大小) 判斷關卡是否變更，
+只為新增或修改過的關卡讀取檔案（二進位格式只讀檔頭），其餘直接使用快取中的名稱、排序編號與方塊數。
+方塊資料本身不在清單中，選到關卡時才由 level_io.load_level 讀取。
+"""
+import json
+import os
+import re
+
+from level_io import BINARY_EXTENSION, read_level_info
+
+INDEX_FILENAME = ".level_index.json"
+INDEX_VERSION = 1
+# 同一個關卡同時有兩種格式時（例如轉換後保留了 JSON），使用排在前面的格式
+LEVEL_EXTENSIONS = (BINARY_EXTENSION, ".json")
+
+
+def level_number(name):
+    """關卡名稱開頭的數字，用來排序；沒有數字時回傳 None（排在最後）"""
+    match = re.match(r"^\s*(\d+)", name or "")
+    return int(match.group(1)) if match else None
+
+
+def _read_entry(path):
+    info = read_level_info(path)
+    return {"name": info["name"], "number": level_number(info["name"]), "blocks": info["blocks"]}
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION: return index.get("levels", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _save_index(index_path, entries):
+    """先寫到暫存檔再取代，避免中途中斷留下損壞的快取"""
+    tmp_path = index_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "levels": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"警告：無法寫入關卡索引 {index_path}: {e}")
+
+
+def scan_levels(levels_dir="levels"):
+    """
+    回傳依編號排序的關卡清單 [{"name", "path", "id", "number", "blocks"}, ...]。
+    只對 stat 結果與快取不同的檔案讀取內容，並在有變動時更新快取檔。
+    """
+    if not os.path.isdir(levels_dir): return []
+    index_path = os.path.join(levels_dir, INDEX_FILENAME)
+    cached = _load_index(index_path)
+    entries, changed = {}, False
+    for dir_entry in os.scandir(levels_dir):
+        file_id, ext = os.path.splitext(dir_entry.name)
+        if ext not in LEVEL_EXTENSIONS or dir_entry.name == INDEX_FILENAME or not dir_entry.is_file(): continue
+        st = dir_entry.stat()
+        entry = cached.get(dir_entry.name)
+        if entry is None or entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size:
+            try:
+                entry = dict(_read_entry(dir_entry.path), mtime_ns=st.st_mtime_ns, size=st.st_size)
+            except Exception as e:
+                print(f"警告：無法載入關卡 {dir_entry.name}: {e}")
+                continue
+            changed = True
+        entries[dir_entry.name] = entry
+    if changed or entries.keys() != cached.keys(): _save_index(index_path, entries)
+
+    by_id = {}
+    for filename in sorted(entries, key=lambda name: LEVEL_EXTENSIONS.index(os.path.splitext(name)[1])):
+        by_id.setdefault(os.path.splitext(filename)[0], filename)
+    levels = [{"name": entries[filename]["name"], "path": os.path.join(levels_dir, filename), "id": file_id,
+               "number": float('inf') if entries[filename]["number"] is None else entries[filename]["number"], "blocks": entries[filename]["blocks"]}
+              for file_id, filename in by_id.items()]
+    levels.sort(key=lambda l: l['number'])
+    return levels
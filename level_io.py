@@ -0,0 +1,116 @@
+# level_io.py
+"""
+關卡檔案的讀寫（不依賴 PyQt / OpenGL）。
+支援兩種格式，讀取時依檔案開頭自動判斷：
+  - JSON：{"name", "size", "blocks": [{"pos": [x, y, z], "color": c}, ...]}
+  - 二進位 (.vxl)：固定長度的檔頭 + 名稱 + 緊密排列的座標陣列 (N, 3) 與顏色陣列 (N,)，
+    以 numpy.memmap 直接映射，不需要解析。
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from voxel_store import ChunkedVoxelStore
+
+DEFAULT_GRID_SIZE = 7
+
+BINARY_EXTENSION = ".vxl"
+BINARY_MAGIC = b"VOXL"
+BINARY_VERSION = 1
+# magic, 版本, 座標位元組數 (1 = int8, 2 = int16), 名稱長度, 網格大小, 方塊數
+BINARY_HEADER = struct.Struct("<4sBBHHI")
+_COORD_DTYPES = {1: np.int8, 2: np.int16}
+
+
+def normalize_grid_size(size):
+    """網格以原點為中心，邊長必須是奇數"""
+    size = max(1, int(size))
+    return size if size % 2 else size + 1
+
+
+def is_binary_level(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _read_binary_header(path):
+    """回傳 (name, size, coord_bytes, count, data_offset)"""
+    with open(path, "rb") as f:
+        magic, version, coord_bytes, name_len, size, count = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION or coord_bytes not in _COORD_DTYPES:
+            raise ValueError(f"不支援的關卡格式: {path}")
+        name = f.read(name_len).decode("utf-8")
+    # 座標陣列從 4 的倍數位置開始
+    data_offset = (BINARY_HEADER.size + name_len + 3) // 4 * 4
+    return name, size, coord_bytes, count, data_offset
+
+
+def read_binary_arrays(path):
+    """以 memmap 映射二進位關卡的方塊資料，回傳 (name, size, positions (N, 3), colors (N,))，陣列為唯讀"""
+    name, size, coord_bytes, count, offset = _read_binary_header(path)
+    if not count: return name, size, np.zeros((0, 3), dtype=_COORD_DTYPES[coord_bytes]), np.zeros(0, dtype=np.int8)
+    positions = np.memmap(path, dtype=_COORD_DTYPES[coord_bytes], mode="r", offset=offset, shape=(count, 3))
+    colors = np.memmap(path, dtype=np.int8, mode="r", offset=offset + positions.nbytes, shape=(count,))
+    return name, size, positions, colors
+
+
+def read_level_info(path):
+    """只讀取關卡名稱、網格大小與方塊數（二進位格式只讀檔頭），給關卡索引使用"""
+    if is_binary_level(path):
+        name, size, _, count, _ = _read_binary_header(path)
+        return {"name": name, "size": size, "blocks": count}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {"name": data["name"], "size": data.get("size") or DEFAULT_GRID_SIZE, "blocks": len(data.get("blocks", []))}
+
+
+def load_level(path, with_store=True):
+    """
+    讀取關卡（JSON 或二進位格式，自動判斷），回傳 {"name", "size", "half", "store", "positions", "colors"}。
+    舊關卡沒有 "size" 欄位時使用預設的 7；若方塊超出範圍則自動放大到剛好容納所有方塊。
+    二進位格式的 positions / colors 是唯讀的 memmap；只需要陣列（建立 dense volume、上傳 GPU）時
+    以 with_store=False 呼叫，就不會建立 ChunkedVoxelStore（"store" 為 None），省去轉成 int64 與分塊的複製。
+    """
+    if is_binary_level(path):
+        name, size, positions, colors = read_binary_arrays(path)
+        store = ChunkedVoxelStore.from_arrays(positions, colors) if with_store else None
+        extent = int(np.abs(positions).max()) if len(positions) else 0
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        name, size = data["name"], data.get("size")
+        store = ChunkedVoxelStore.from_blocks(data.get("blocks", []))
+        positions, colors = store.to_arrays()
+        extent = int(np.abs(positions).max()) if len(positions) else 0
+        if not with_store: store = None
+    size = normalize_grid_size(max(size or DEFAULT_GRID_SIZE, 2 * extent + 1))
+    return {"name": name, "size": size, "half": size // 2, "store": store, "positions": positions, "colors": colors}
+
+
+def save_level(path, name, store, size):
+    output_data = {"name": name, "size": normalize_grid_size(size), "blocks": store.to_blocks()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2, ensure_ascii=False)
+
+
+def save_level_binary(path, name, store, size):
+    """寫成二進位格式；座標範圍在 int8 內時以 1 位元組儲存，否則用 int16"""
+    positions, colors = store.to_arrays()
+    coord_bytes = 1 if not len(positions) or np.abs(positions).max() <= 127 else 2
+    name_bytes = name.encode("utf-8")
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, coord_bytes, len(name_bytes), normalize_grid_size(size), len(positions))
+    data_offset = (len(header) + len(name_bytes) + 3) // 4 * 4
+    with open(path, "wb") as f:
+        f.write(header); f.write(name_bytes); f.write(b"\0" * (data_offset - len(header) - len(name_bytes)))
+        f.write(positions.astype(_COORD_DTYPES[coord_bytes]).tobytes()); f.write(colors.astype(np.int8).tobytes())
+
+
+def next_level_path(levels_dir="levels"):
+    """尋找一個不重複的 custom_level_{i}.json 檔名"""
+    i = 1
+    while True:
+        filepath = os.path.join(levels_dir, f"custom_level_{i}.json")
+        if not os.path.exists(filepath): return filepath
+        i += 1
@@ -0,0 +1,168 @@
+# mesher.py
+"""方塊網格的幾何資料與頂點緩衝區建構（只依賴 NumPy，可在沒有 OpenGL 的環境下測試）"""
+import numpy as np
+
+CELL_SIZE = 1.0
+COLORS = {
+    1: (1.0, 0.2, 0.2), 2: (1.0, 0.6, 0.0), 3: (1.0, 1.0, 0.0),
+    4: (0.1, 1.0, 0.1), 5: (0.0, 1.0, 1.0), 6: (0.3, 0.5, 1.0),
+    7: (1.0, 0.2, 1.0), 8: (0.95, 0.95, 0.95)
+}
+# 以顏色編號直接索引的 RGB 查詢表，編號 0 為空白
+COLOR_LUT = np.zeros((max(COLORS) + 1, 3), dtype=np.float32)
+for _cid, _rgb in COLORS.items(): COLOR_LUT[_cid] = _rgb
+
+hs = CELL_SIZE / 2.0
+CUBE_VERTICES = np.array([-hs,-hs,hs, hs,-hs,hs, hs,hs,hs, -hs,hs,hs, -hs,-hs,-hs, -hs,hs,-hs, hs,hs,-hs, hs,-hs,-hs, hs,-hs,-hs, hs,hs,-hs, hs,hs,hs, hs,-hs,hs, -hs,-hs,hs, -hs,hs,hs, -hs,hs,-hs, -hs,-hs,-hs, -hs,hs,hs, hs,hs,hs, hs,hs,-hs, -hs,hs,-hs, -hs,-hs,-hs, hs,-hs,-hs, hs,-hs,hs, -hs,-hs,hs], dtype=np.float32)
+CUBE_NORMALS = np.array([0,0,1,0,0,1,0,0,1,0,0,1, 0,0,-1,0,0,-1,0,0,-1,0,0,-1, 1,0,0,1,0,0,1,0,0,1,0,0, -1,0,0,-1,0,0,-1,0,0,-1,0,0, 0,1,0,0,1,0,0,1,0,0,1,0, 0,-1,0,0,-1,0,0,-1,0,0,-1,0], dtype=np.float32)
+
+VERTEX_STRIDE = 9  # 每個頂點：位置 3 + 法向量 3 + 顏色 3 個 float32
+# 單一方塊 24 個頂點的交錯樣板，顏色欄位留空，由每個方塊的偏移量補上
+CUBE_TEMPLATE = np.hstack([CUBE_VERTICES.reshape(-1, 3), CUBE_NORMALS.reshape(-1, 3), np.zeros((24, 3), dtype=np.float32)])
+
+
+def build_cube_buffer(positions, color_ids, spacing=1.0):
+    """
+    以一次廣播運算建立所有方塊的交錯頂點資料 (position, normal, color)。
+    positions 為 (N, 3) 的格子座標，color_ids 為 (N,) 的顏色編號；回傳長度 N * 24 * 9 的 float32 陣列。
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    offsets = np.zeros((len(positions), VERTEX_STRIDE), dtype=np.float32)
+    offsets[:, 0:3] = positions * spacing
+    offsets[:, 6:9] = COLOR_LUT[np.asarray(color_ids, dtype=np.intp)]
+    # 先把每個方塊的偏移量複製成 24 個頂點，再對連續的 216 個 float 做廣播加法；
+    # 直接對 (N, 24, 9) 廣播的最內層迴圈只有 9 個元素，反而慢兩倍以上
+    vbo_data = np.repeat(offsets, 24, axis=0).reshape(-1, 24 * VERTEX_STRIDE)
+    vbo_data += CUBE_TEMPLATE.reshape(-1)
+    return vbo_data.reshape(-1)
+
+
+# 六個面各 4 個頂點，順序與 CUBE_VERTICES 相同：+Z, -Z, +X, -X, +Y, -Y
+FACE_TEMPLATES = CUBE_TEMPLATE.reshape(6, 4, VERTEX_STRIDE)
+# (面編號, 法向軸, 法向正負)
+FACE_DIRECTIONS = [(k, int(np.argmax(np.abs(FACE_TEMPLATES[k, 0, 3:6]))), int(FACE_TEMPLATES[k, 0, 3:6].sum())) for k in range(6)]
+
+
+def _visible_face_colors(volume, axis, sign):
+    """某個方向上外露的面：該格有方塊且相鄰格為空（網格外視為空），回傳與 volume 同形狀的顏色陣列"""
+    neighbor = np.zeros_like(volume)
+    src, dst = [slice(None)] * 3, [slice(None)] * 3
+    if sign > 0: dst[axis], src[axis] = slice(0, -1), slice(1, None)
+    else: dst[axis], src[axis] = slice(1, None), slice(0, -1)
+    neighbor[tuple(dst)] = volume[tuple(src)]
+    return np.where(neighbor == 0, volume, 0)
+
+
+def _merge_rects(faces, greedy):
+    """
+    faces 為 (A, V, U) 的外露面顏色陣列（A 是法向軸）。
+    回傳矩形 (a, v0, u0, h, w, color)；不合併時每個面都是 1x1 的矩形。
+    合併時先沿 U 軸找出同色的連續線段，再把相鄰列中起點、長度、顏色都相同的線段疊成矩形。
+    """
+    if not greedy:
+        a, v, u = np.nonzero(faces)
+        ones = np.ones_like(a)
+        return a, v, u, ones, ones, faces[a, v, u]
+    A, V, U = faces.shape
+    # 每列尾端多補一格 0，保證每段線段都會在同一列內結束
+    rows = np.zeros((A * V, U + 1), dtype=faces.dtype)
+    rows[:, :U] = faces.reshape(A * V, U)
+    prev = np.zeros_like(rows)
+    prev[:, 1:] = rows[:, :-1]
+    changes = np.flatnonzero(rows != prev)
+    is_start = rows.reshape(-1)[changes] != 0
+    starts = changes[is_start]
+    ends = changes[np.flatnonzero(is_start) + 1]
+    r, u0 = np.divmod(starts, U + 1)
+    a, v = np.divmod(r, V)
+    w = ends - starts
+    color = rows.reshape(-1)[starts]
+    order = np.lexsort((v, color, w, u0, a))
+    a, v, u0, w, color = a[order], v[order], u0[order], w[order], color[order]
+    same = np.zeros(len(a), dtype=bool)
+    same[1:] = (a[1:] == a[:-1]) & (u0[1:] == u0[:-1]) & (w[1:] == w[:-1]) & (color[1:] == color[:-1]) & (v[1:] == v[:-1] + 1)
+    first = np.flatnonzero(~same)
+    h = np.diff(np.append(first, len(a)))
+    return a[first], v[first], u0[first], h, w[first], color[first]
+
+
+def exposed_chunks(volume, chunk):
+    """
+    至少有一個外露面的 chunk³ 區塊座標 [(cx, cy, cz), ...]（依 volume 索引切分）。
+    完全空白或完全被包在內部的區塊不會產生任何面，整體重建時可以跳過，不必逐塊呼叫 build_face_buffer。
+    """
+    solid = volume != 0
+    p = np.pad(solid, 1)
+    exposed = solid & ~(p[:-2, 1:-1, 1:-1] & p[2:, 1:-1, 1:-1] & p[1:-1, :-2, 1:-1] & p[1:-1, 2:, 1:-1] & p[1:-1, 1:-1, :-2] & p[1:-1, 1:-1, 2:])
+    counts = [(n - 1) // chunk + 1 for n in volume.shape]
+    padded = np.zeros([c * chunk for c in counts], dtype=bool)
+    padded[tuple(slice(0, n) for n in volume.shape)] = exposed
+    occupied = padded.reshape(counts[0], chunk, counts[1], chunk, counts[2], chunk).any(axis=(1, 3, 5))
+    return [tuple(k) for k in np.argwhere(occupied).tolist()]
+
+
+def build_face_buffer(volume, half, greedy=False, region=None):
+    """
+    只為外露的面建立頂點資料（與相鄰實心方塊共用的面會被剔除），格式與 build_cube_buffer 相同。
+    greedy=True 時再把同一平面上相鄰且同色的面合併成較大的四邊形。
+    region=((x0, x1), (y0, y1), (z0, z1)) 為 volume 索引範圍，只輸出該區塊內方塊的面（鄰格判斷仍會看區塊外一格）。
+    回傳 (vbo_data, vertex_count)。
+    """
+    if region is None: region = [(0, n) for n in volume.shape]
+    # 多取一圈鄰格來判斷區塊邊界上的面是否外露
+    crop_lo = [max(r0 - 1, 0) for r0, _ in region]
+    crop = volume[tuple(slice(lo, min(r1 + 1, n)) for lo, (_, r1), n in zip(crop_lo, region, volume.shape))]
+    inner = tuple(slice(r0 - lo, r1 - lo) for lo, (r0, r1) in zip(crop_lo, region))
+    origin = np.array([r0 for r0, _ in region]) - half
+    buffers = []
+    for k, axis, sign in FACE_DIRECTIONS:
+        faces = _visible_face_colors(crop, axis, sign)[inner]
+        v_axis, u_axis = [i for i in range(3) if i != axis]
+        a, v, u0, h, w, color = _merge_rects(np.transpose(faces, (axis, v_axis, u_axis)), greedy)
+        if not len(a): continue
+        a, v, u0 = a + origin[axis], v + origin[v_axis], u0 + origin[u_axis]
+        lo = np.zeros((len(a), 3), dtype=np.float32); hi = np.zeros((len(a), 3), dtype=np.float32)
+        lo[:, axis] = hi[:, axis] = a * CELL_SIZE + sign * hs
+        lo[:, v_axis] = v * CELL_SIZE - hs; hi[:, v_axis] = (v + h - 1) * CELL_SIZE + hs
+        lo[:, u_axis] = u0 * CELL_SIZE - hs; hi[:, u_axis] = (u0 + w - 1) * CELL_SIZE + hs
+        template = FACE_TEMPLATES[k]
+        quads = np.empty((len(a), 4, VERTEX_STRIDE), dtype=np.float32)
+        # 依樣板頂點在各軸上的正負決定取矩形的哪一角，保持原本的頂點順序（正面朝外）
+        quads[:, :, 0:3] = np.where(template[None, :, 0:3] < 0, lo[:, None, :], hi[:, None, :])
+        quads[:, :, 3:6] = template[None, :, 3:6]
+        quads[:, :, 6:9] = COLOR_LUT[color.astype(np.intp)][:, None, :]
+        buffers.append(quads.reshape(-1))
+    if not buffers: return np.zeros(0, dtype=np.float32), 0
+    vbo_data = np.concatenate(buffers)
+    return vbo_data, len(vbo_data) // VERTEX_STRIDE
+
+
+GIZMO_STRIDE = 6  # 每個頂點：位置 3 + 顏色 3 個 float32
+GIZMO_AXIS_COLORS = ((1.0, 0.2, 0.2), (0.2, 1.0, 0.2), (0.2, 0.6, 1.0))
+
+
+def build_gizmo_buffer(half, arrow_radius=0.25, arrow_height=0.8, slices=15):
+    """
+    網格外框、三條座標軸與軸端箭頭（圓錐）的頂點資料，只與網格大小有關。
+    回傳 (vbo_data, ranges)，ranges 為 {'frame' / 'axes' / 'arrows': (first, count)}；
+    外框與座標軸以 GL_LINES 繪製，箭頭以 GL_TRIANGLES 繪製。
+    """
+    s = (half + 0.5) * (CELL_SIZE + 0.18)
+    s_axis = (half + 1.0) * (CELL_SIZE + 0.18)
+    corners = np.array([[x, y, z] for z in (s, -s) for x, y in ((-s, -s), (s, -s), (s, s), (-s, s))], dtype=np.float32)
+    edges = [(i, (i + 1) % 4) for i in range(4)] + [(4 + i, 4 + (i + 1) % 4) for i in range(4)] + [(i, i + 4) for i in range(4)]
+    frame = [(corners[i], (0.8, 0.8, 0.8)) for edge in edges for i in edge]
+    axes, arrows = [], []
+    # 每軸取一組右手座標基底 (a, b, 軸方向)，讓圓錐的三角形從外側看都是逆時針
+    eye = np.eye(3, dtype=np.float32)
+    angles = np.linspace(0.0, 2.0 * np.pi, slices + 1)
+    for axis, color in enumerate(GIZMO_AXIS_COLORS):
+        a, b, d = eye[(axis + 1) % 3], eye[(axis + 2) % 3], eye[axis]
+        axes += [(-s_axis * d, color), (s_axis * d, color)]
+        ring = [s_axis * d + arrow_radius * (np.cos(t) * a + np.sin(t) * b) for t in angles]
+        apex = (s_axis + arrow_height) * d
+        for i in range(slices): arrows += [(ring[i], color), (ring[i + 1], color), (apex, color)]
+    vertices = frame + axes + arrows
+    vbo_data = np.array([np.concatenate([pos, color]) for pos, color in vertices], dtype=np.float32).reshape(-1)
+    ranges = {'frame': (0, len(frame)), 'axes': (len(frame), len(axes)), 'arrows': (len(frame) + len(axes), len(arrows))}
+    return vbo_data, ranges
@@ -0,0 +1,54 @@
+# particles.py
+"""以 NumPy 陣列儲存的粒子系統（結構陣列，只依賴 NumPy）"""
+import numpy as np
+
+from mesher import COLORS, COLOR_LUT, CUBE_VERTICES
+
+PARTICLE_SIZE = 0.2
+PARTICLE_STRIDE = 6  # 每個頂點：位置 3 + 顏色 3 個 float32
+# 粒子是小方塊，沿用方塊的 24 個頂點（不需要法向量，粒子不受光照影響）
+PARTICLE_TEMPLATE = CUBE_VERTICES.reshape(-1, 3) * PARTICLE_SIZE
+
+
+class ParticleSystem:
+    """
+    位置、速度、壽命與顏色各存成一個陣列，每一幀以一次向量運算積分所有粒子，
+    再一次產生所有粒子的頂點資料，粒子數量增加時 Python 端的成本不會跟著成長。
+    """
+    def __init__(self):
+        self.pos = np.zeros((0, 3), dtype=np.float32)
+        self.vel = np.zeros((0, 3), dtype=np.float32)
+        self.life = np.zeros(0, dtype=np.int32)
+        self.color = np.zeros((0, 3), dtype=np.float32)
+
+    def emit(self, center, count, life=100, rng=None):
+        """從 center 噴出 count 個粒子，速度與顏色隨機"""
+        rng = rng or np.random.default_rng()
+        vel = rng.uniform((-1.5, 2.0, -1.5), (1.5, 4.0, 1.5), size=(count, 3)).astype(np.float32)
+        color_ids = rng.choice(list(COLORS), size=count)
+        self.pos = np.concatenate([self.pos, np.tile(np.asarray(center, dtype=np.float32), (count, 1))])
+        self.vel = np.concatenate([self.vel, vel])
+        self.life = np.concatenate([self.life, np.full(count, life, dtype=np.int32)])
+        self.color = np.concatenate([self.color, COLOR_LUT[color_ids]])
+
+    def step(self, dt=0.1, gravity=0.1):
+        """前進一幀並移除壽命結束的粒子"""
+        self.pos += self.vel * dt
+        self.vel[:, 1] -= gravity
+        self.life -= 1
+        alive = self.life > 0
+        if not alive.all():
+            self.pos, self.vel, self.life, self.color = self.pos[alive], self.vel[alive], self.life[alive], self.color[alive]
+
+    def clear(self):
+        self.__init__()
+
+    def build_buffer(self):
+        """所有粒子的交錯頂點資料 (position, color)，長度 N * 24 * 6 的 float32 陣列"""
+        vbo_data = np.empty((len(self), 24, PARTICLE_STRIDE), dtype=np.float32)
+        vbo_data[:, :, 0:3] = self.pos[:, None, :] + PARTICLE_TEMPLATE[None, :, :]
+        vbo_data[:, :, 3:6] = self.color[:, None, :]
+        return vbo_data.reshape(-1)
+
+    def __len__(self):
+        return len(self.life)
@@ -0,0 +1,107 @@
+# progress_store.py
+"""
+玩家進度的儲存（SQLite）。寫入在背景執行緒進行，短時間內的多次更新會合併成一次交易；
+SQLite 的交易保證寫到一半中斷時不會留下損壞的檔案。第一次使用時會匯入舊的 progress.json（只嘗試一次，記錄在 meta 表）。
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from debounce import DebouncedWorker
+
+DEFAULT_PLAYER = "default"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    player     TEXT NOT NULL,
+    level_id   TEXT NOT NULL,
+    completed  INTEGER NOT NULL DEFAULT 0,
+    best_score INTEGER NOT NULL DEFAULT 0,
+    best_code  TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (player, level_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)  # 建立後只交給寫入執行緒使用
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class ProgressStore:
+    """
+    all() 回傳 {level_id: {"completed", "best_score", "best_code"}} 的記憶體副本，讀取不經過磁碟；
+    set() 立即更新記憶體並排入背景寫入，flush_delay 秒內的其他更新會一起寫入；
+    更新持續不斷時最晚在第一筆之後 max_flush_delay 秒寫入。寫入失敗的更新會留到下一次再寫。
+    """
+    def __init__(self, path="progress.db", player=DEFAULT_PLAYER, legacy_json="progress.json", flush_delay=0.5, max_flush_delay=5.0):
+        self.path = path
+        self.player = player
+        self._conn = _connect(path)
+        rows = self._conn.execute("SELECT level_id, completed, best_score, best_code FROM progress WHERE player = ?", (player,)).fetchall()
+        if not rows and legacy_json: rows = self._import_legacy(self._conn, legacy_json)
+        self._data = {level_id: {"completed": bool(completed), "best_score": best_score, "best_code": best_code}
+                      for level_id, completed, best_score, best_code in rows}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._writer = DebouncedWorker(self._write_pending, flush_delay, max_flush_delay, name="progress-writer")
+
+    def _import_legacy(self, conn, legacy_json):
+        """
+        把舊的 progress.json 匯入資料庫；檔案損壞時提示而不是默默忽略。
+        不論成功與否都在 meta 表記下已嘗試過，之後啟動不再重新匯入（也不會每次都對同一個壞檔案發出警告）。
+        """
+        key = f"legacy_import:{self.player}"
+        if not os.path.exists(legacy_json) or conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone(): return []
+        try:
+            with open(legacy_json, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            if not isinstance(legacy, dict): raise ValueError("內容不是 {關卡: 進度} 物件")
+            rows = [(level_id, bool(p.get("completed")), int(p.get("best_score", 0)), p.get("best_code", "")) for level_id, p in legacy.items()]
+        except (ValueError, OSError, AttributeError, TypeError) as e:
+            print(f"警告：無法讀取舊的進度檔 {legacy_json}，將不匯入: {e}")
+            rows = []
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)", [(self.player, *row) for row in rows])
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, os.path.abspath(legacy_json)))
+        return rows
+
+    def all(self):
+        return {level_id: dict(record) for level_id, record in self._data.items()}
+
+    def get(self, level_id, default=None):
+        record = self._data.get(level_id)
+        return dict(record) if record is not None else ({} if default is None else default)
+
+    def set(self, level_id, record):
+        record = {"completed": bool(record.get("completed")), "best_score": int(record.get("best_score", 0)), "best_code": record.get("best_code", "")}
+        self._data[level_id] = record
+        with self._lock: self._pending[level_id] = record
+        self._writer.notify()
+
+    def _write_pending(self):
+        """在寫入執行緒中把累積的更新以一次交易寫入"""
+        with self._lock: batch, self._pending = self._pending, {}
+        if not batch: return
+        try:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)",
+                                       [(self.player, level_id, r["completed"], r["best_score"], r["best_code"]) for level_id, r in batch.items()])
+        except sqlite3.Error as e:
+            # 放回待寫入的佇列，flush_delay 後再試；期間同一關卡若有更新的紀錄則以新的為準
+            print(f"警告：無法儲存進度，稍後重試: {e}")
+            with self._lock:
+                for level_id, record in batch.items(): self._pending.setdefault(level_id, record)
+            self._writer.notify()
+
+    def close(self):
+        """寫入所有尚未儲存的更新後結束背景執行緒"""
+        self._writer.close()
+        self._conn.close()
@@ -0,0 +1,60 @@
+# rule_cache.py
+"""以正規化 AST 為鍵的規則快取：只改了空白或註解的程式碼會命中同一筆結果（不依賴 PyQt / OpenGL）"""
+import ast
+import hashlib
+from collections import OrderedDict
+
+
+class RuleCache:
+    """
+    LRU 快取，每筆以 wrap_code 結果的 AST 雜湊為鍵，保存編譯後的 code object 與各網格大小 (half) 求出的 volume。
+    復原 / 重做或在兩份解答之間切換時可直接取用先前的結果，不必重新求值。
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {key: {"code": code object, "volumes": {half: volume}}}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(wrapped_code):
+        """AST 的雜湊（ast.dump 不含行號與欄位，註解與空白也不在 AST 中）；語法錯誤時丟出 SyntaxError"""
+        tree = ast.parse(wrapped_code)
+        return hashlib.sha1(ast.dump(tree).encode("utf-8")).hexdigest()
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {"code": None, "volumes": {}}
+            if len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return entry
+
+    def code(self, key, wrapped_code):
+        """編譯後的 code object，同一個鍵只編譯一次"""
+        entry = self._entry(key)
+        if entry["code"] is None: entry["code"] = compile(wrapped_code, "<rule>", "exec")
+        return entry["code"]
+
+    def lookup(self, key, half):
+        """查詢該網格大小的結果，並計入命中率；沒有時回傳 None"""
+        entry = self._entries.get(key)
+        volume = entry["volumes"].get(half) if entry else None
+        if volume is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return volume
+
+    def store(self, key, half, volume):
+        volume.flags.writeable = False  # 快取中的結果會被重複使用，不允許就地修改
+        self._entry(key)["volumes"][half] = volume
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
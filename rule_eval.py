@@ -0,0 +1,199 @@
+# rule_eval.py
+"""玩家規則函式 rule(x, y, z) 的求值工具（不依賴 PyQt / OpenGL）"""
+import dis
+from collections import namedtuple
+
+import numpy as np
+
+MAX_SCORE = 1000
+SAMPLE_CELLS = 4  # 向量化結果除了角落與原點之外，再隨機抽查幾格與逐格呼叫的結果比對
+
+
+def wrap_code(user_code):
+    """把編輯器中的程式碼（函式本體）包成 def rule(x,y,z)，並在結尾補上 return 0"""
+    lines=user_code.split("\n");wrapped="def rule(x,y,z):\n"
+    for l in lines:
+        if l.strip()=="":continue
+        wrapped+="    "+l+"\n"
+    wrapped+="    return 0\n";return wrapped
+
+
+def compile_rule(wrapped_code):
+    """執行 wrap_code 的結果（原始碼或 code object）並回傳 rule 函式；先試跑 rule(0, 0, 0)，讓執行期錯誤也能回報給玩家"""
+    local_vars = {}
+    exec(wrapped_code, {}, local_vars); rule_func = local_vars["rule"]
+    rule_func(0, 0, 0)
+    return rule_func
+
+
+def score_code(code):
+    """程式碼越短分數越高：每個字元扣 2 分（前後空白不計）"""
+    return max(0, MAX_SCORE - len(code.strip()) * 2)
+
+
+def grid_coords(half, z_range=None):
+    """以 np.meshgrid (indexing='ij') 建立 x, y, z 座標陣列，形狀為 (N, N, 該 Z 區段的層數)"""
+    axis = np.arange(-half, half + 1)
+    z_axis = np.arange(*z_range) if z_range else axis
+    return np.meshgrid(axis, axis, z_axis, indexing='ij')
+
+
+def plan_slabs(half, count):
+    """把 Z 軸切成最多 count 個連續、互不重疊的區段 [(z_start, z_stop), ...]"""
+    size = 2 * half + 1
+    count = max(1, min(count, size))
+    bounds = [-half + size * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(count)]
+
+
+def _reads_arguments(rule_func):
+    """rule 的程式碼（含巢狀函式與推導式）是否讀取了 x, y, z 任一個參數"""
+    params = set(rule_func.__code__.co_varnames[:rule_func.__code__.co_argcount])
+    codes = [rule_func.__code__]
+    while codes:
+        code = codes.pop()
+        codes.extend(c for c in code.co_consts if hasattr(c, "co_code"))
+        for ins in dis.get_instructions(code):
+            if ins.opname in ("LOAD_FAST", "LOAD_DEREF", "LOAD_CLOSURE", "LOAD_FAST_CHECK") and ins.argval in params: return True
+    return False
+
+
+def _sample_cells(half, z_range):
+    """抽查用的格子：區段的 8 個角落、原點（若在區段內）與 SAMPLE_CELLS 個固定亂數種子選出的格子"""
+    z_start, z_stop = z_range or (-half, half + 1)
+    cells = {(x, y, z) for x in (-half, half) for y in (-half, half) for z in (z_start, z_stop - 1)}
+    if z_start <= 0 < z_stop: cells.add((0, 0, 0))
+    rng = np.random.default_rng(0)
+    for _ in range(SAMPLE_CELLS):
+        cells.add((int(rng.integers(-half, half + 1)), int(rng.integers(-half, half + 1)), int(rng.integers(z_start, z_stop))))
+    return sorted(cells)
+
+
+def _evaluate_vectorized(rule_func, half, color_ids, z_range):
+    """
+    把整個區段的座標陣列一次丟給 rule；程式碼若對純量做分支判斷會丟出例外，由呼叫端改走逐格模式。
+    陣列運算的語意不一定與純量相同（`1 << x` 溢位、`len(str(x))` 之類），所以結果會先抽查幾格與逐格呼叫比對，
+    不一致就回傳 None 改走逐格模式。
+    """
+    xs, ys, zs = grid_coords(half, z_range)
+    # 除以零等數值錯誤在逐格模式下只會跳過該格，這裡必須改為丟出例外才能退回逐格模式
+    with np.errstate(all='raise'):
+        result = np.asarray(rule_func(xs, ys, zs))
+    if not (np.issubdtype(result.dtype, np.number) or result.dtype == np.bool_):
+        return None
+    # 讀了座標卻只回傳一個值，代表陣列被當成單一物件處理（例如 len(x)），不是逐格的結果
+    if result.ndim == 0 and _reads_arguments(rule_func): return None
+    result = np.broadcast_to(result, xs.shape)  # 支援 `return 3` 這類常數回傳值
+    valid = np.isin(result, list(color_ids))
+    volume = np.where(valid, result, 0).astype(np.int8)
+    z_start = z_range[0] if z_range else -half
+    for x, y, z in _sample_cells(half, z_range):
+        try:
+            color_id = rule_func(x, y, z)
+            if color_id not in color_ids: color_id = 0
+        except Exception: color_id = 0
+        if color_id != volume[x + half, y + half, z - z_start]: return None
+    return volume
+
+
+def _evaluate_per_cell(rule_func, half, color_ids, z_range):
+    """原本的逐格求值：每一格各自 try/except，出錯的格子視為空白"""
+    size = 2 * half + 1
+    z_start, z_stop = z_range or (-half, half + 1)
+    volume = np.zeros((size, size, z_stop - z_start), dtype=np.int8)
+    for z in range(z_start, z_stop):
+        for y in range(-half, half + 1):
+            for x in range(-half, half + 1):
+                try:
+                    color_id = rule_func(x, y, z)
+                    if color_id in color_ids: volume[x + half, y + half, z - z_start] = color_id
+                except Exception: continue
+    return volume
+
+
+def evaluate_rule(rule_func, half, color_ids, vectorize=True, z_range=None):
+    """
+    求出整個網格的顏色體積 (dense int8 volume)。
+    volume[x + half, y + half, z + half] 為該格的顏色編號，0 代表空白。
+    預設先嘗試向量化模式，失敗時自動退回逐格模式。
+    指定 z_range=(z_start, z_stop) 時只計算該 Z 區段，回傳 volume[:, :, z_start + half:z_stop + half] 的部分。
+    """
+    if vectorize:
+        try:
+            volume = _evaluate_vectorized(rule_func, half, color_ids, z_range)
+            if volume is not None: return volume
+        except Exception:
+            pass
+    return _evaluate_per_cell(rule_func, half, color_ids, z_range)
+
+
+# first 為 (x, y, z, 目標顏色, 規則結果)；count / heatmap 只有在要求時才計算，否則為 None
+CompareResult = namedtuple("CompareResult", "match first count heatmap")
+
+
+def _compare_per_cell(rule_func, target, half, color_ids, stop_early):
+    """逐格比對（順序與 _evaluate_per_cell 相同），回傳 (first, count, heatmap)"""
+    first, count = None, 0
+    heatmap = None if stop_early else np.zeros(target.shape[:2], dtype=np.int32)
+    for z in range(-half, half + 1):
+        for y in range(-half, half + 1):
+            for x in range(-half, half + 1):
+                try:
+                    color_id = rule_func(x, y, z)
+                    if color_id not in color_ids: color_id = 0
+                except Exception: color_id = 0
+                expected = int(target[x + half, y + half, z + half])
+                if color_id == expected: continue
+                if first is None: first = (x, y, z, expected, int(color_id))
+                if stop_early: return first, None, None
+                count += 1; heatmap[x + half, y + half] += 1
+    return first, count, heatmap
+
+
+def compare_rule(rule_func, target, half, color_ids, vectorize=True, slab_layers=1, count=False, heatmap=False):
+    """
+    以 target（dense volume）檢查規則，遇到第一個不同的格子就停止，不必先求出整個網格。
+    向量化時一次計算 slab_layers 層 Z 區段再比對；規則無法向量化時逐格比對。
+    count / heatmap 為 True 時會檢查完整個網格，計算不同的格子數與沿 Z 軸加總的 (x, y) 熱度圖。
+    回傳 CompareResult。
+    """
+    stop_early = not (count or heatmap)
+    first, total = None, 0
+    mismatch_map = np.zeros(target.shape[:2], dtype=np.int32)
+    slabs = [(z, min(z + slab_layers, half + 1)) for z in range(-half, half + 1, slab_layers)]
+    for i, z_range in enumerate(slabs if vectorize else []):
+        try:
+            volume = _evaluate_vectorized(rule_func, half, color_ids, z_range)
+        except Exception:
+            volume = None
+        if volume is None:
+            # 規則無法向量化時通常在第一個區段就會發現，之後整個改用逐格比對
+            if i == 0: vectorize = False; break
+            volume = _evaluate_per_cell(rule_func, half, color_ids, z_range)
+        diff = volume != target[:, :, z_range[0] + half:z_range[1] + half]
+        if not diff.any(): continue
+        if first is None:
+            x, y, z = min(map(tuple, np.argwhere(diff).tolist()), key=lambda p: (p[2], p[1], p[0]))
+            first = (x - half, y - half, z + z_range[0], int(target[x, y, z + z_range[0] + half]), int(volume[x, y, z]))
+        if stop_early: break
+        total += int(diff.sum()); mismatch_map += diff.sum(axis=2)
+    if not vectorize:
+        first, total, mismatch_map = _compare_per_cell(rule_func, target, half, color_ids, stop_early)
+    return CompareResult(first is None, first, total if count else None, mismatch_map if heatmap else None)
+
+
+def volume_to_voxels(volume, half):
+    """dense volume -> {(x, y, z): color_id}"""
+    positions = np.argwhere(volume)
+    colors = volume[tuple(positions.T)]
+    return {tuple(p): int(c) for p, c in zip((positions - half).tolist(), colors.tolist())}
+
+
+def voxels_to_volume(voxels, half):
+    """{(x, y, z): color_id} -> dense volume；若有方塊超出網格範圍則回傳 None"""
+    size = 2 * half + 1
+    volume = np.zeros((size, size, size), dtype=np.int8)
+    for (x, y, z), color_id in voxels.items():
+        if not (-half <= x <= half and -half <= y <= half and -half <= z <= half): return None
+        volume[x + half, y + half, z + half] = color_id
+    return volume
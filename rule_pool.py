@@ -0,0 +1,207 @@
+# rule_pool.py
+"""在獨立的工作行程中編譯並求值玩家程式碼，避免 `while True:` 之類的程式卡住 GUI"""
+import marshal
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from rule_eval import compile_rule, evaluate_rule, plan_slabs
+
+# ok 為 True 時 payload 是 dense volume，否則是錯誤訊息字串
+EvalResult = namedtuple("EvalResult", "job_id ok payload elapsed")
+
+
+DEFAULT_MAX_WORKERS = 4  # 預設的工作行程數上限；行程越多，取消時要重新啟動的也越多
+
+
+def _worker_main(conn):
+    """
+    工作行程主迴圈：接收 (job_id, slab_index, wrapped_code, half, color_ids, z_range)，回傳該 Z 區段的結果。
+    wrapped_code 可以是原始碼，或是以 marshal 序列化的 code object（由主行程編譯好，省去重複編譯）。
+    啟動完成時送出 "ready"；收到工作時先回覆 (job_id, slab_index)，主行程從這時才開始計算逾時。
+    """
+    conn.send("ready")
+    while True:
+        try: msg = conn.recv()
+        except EOFError: break
+        if msg is None: break
+        job_id, slab_index, wrapped, half, color_ids, z_range = msg
+        conn.send((job_id, slab_index))
+        start = time.perf_counter()
+        try:
+            if isinstance(wrapped, bytes): wrapped = marshal.loads(wrapped)
+            rule_func = compile_rule(wrapped)
+            volume = evaluate_rule(rule_func, half, color_ids, z_range=z_range)
+            conn.send((job_id, slab_index, True, volume, time.perf_counter() - start))
+        except Exception as e:
+            conn.send((job_id, slab_index, False, str(e), time.perf_counter() - start))
+
+
+class _Worker:
+    """單一工作行程與其通訊管線"""
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.job_id = None
+        self.started_at = None  # 行程確認收到工作的時間
+        self.result = None
+
+    def send(self, job_id, slab_index, payload):
+        self.job_id, self.started_at, self.result = job_id, None, None
+        self.conn.send((job_id, slab_index) + payload)
+
+    def receive(self):
+        """讀取所有已送達的訊息；行程已結束時丟出 EOFError / OSError（啟動中結束時可能是 ConnectionResetError）"""
+        while self.conn.poll():
+            msg = self.conn.recv()
+            if msg == "ready": self.ready = True
+            elif msg[0] != self.job_id: continue  # 已取消的工作留下的訊息
+            elif len(msg) == 2: self.started_at = time.perf_counter()
+            else: self.result = msg
+
+    def kill(self):
+        """強制結束但不等待，由 RuleWorkerPool 稍後回收"""
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class RuleWorkerPool:
+    """
+    常駐的規則求值行程池。
+    一次只執行一個工作：送出新工作會取消尚未完成的舊工作。
+    大網格會沿 Z 軸切成數個區段分給各行程同時計算，再依序合併成一個 volume；
+    小網格（層數少於 min_slab_layers 的兩倍）只用一個行程，省去切分與合併的成本。
+    取消或逾時強制結束的行程由預先啟動的備用行程接手；不夠時空出的位置由背景執行緒補上新行程，
+    新工作只分給已經啟動完成的行程，不必等待冷啟動。逾時從行程確認收到工作時才開始計算。
+    """
+    def __init__(self, timeout=2.0, workers=None, min_slab_layers=8, spares=1):
+        self.timeout = timeout
+        self.min_slab_layers = min_slab_layers
+        self.spare_count = spares
+        # 與 Windows 的行為一致，也避免 fork 複製 Qt / OpenGL 狀態
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers = [_Worker(self._ctx) for _ in range(workers or min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS))]
+        self._spares = [_Worker(self._ctx) for _ in range(spares)]
+        self._dying = []  # 已強制結束、尚未回收的行程
+        self._refill_thread = None
+        self._closed = False
+        self._next_job_id = 0
+        self._slabs = []
+        self._submitted_at = 0.0
+
+    def _busy_workers(self):
+        return [w for w in self._workers if w is not None and w.job_id is not None]
+
+    @property
+    def busy(self):
+        return bool(self._busy_workers())
+
+    def submit(self, wrapped_code, half, color_ids):
+        """送出求值工作並立即返回 job_id，結果請以 poll() 取得"""
+        self.cancel()
+        self._next_job_id += 1
+        with self._lock:
+            workers = [w for w in self._workers if w is not None]
+            if not workers:  # 背景補充還沒完成：直接啟動一個（逾時從它確認收到工作時才計算）
+                workers = [_Worker(self._ctx)]; self._workers[0] = workers[0]
+        for worker in workers:
+            try: worker.receive()
+            except (EOFError, OSError): pass
+        ready = [w for w in workers if w.ready and w.process.is_alive()] or workers
+        size = 2 * half + 1
+        count = min(len(ready), max(1, size // self.min_slab_layers))
+        slab_ranges = plan_slabs(half, count)
+        self._slabs = [None] * len(slab_ranges)
+        self._submitted_at = time.perf_counter()
+        for i, z_range in enumerate(slab_ranges):
+            ready[i].send(self._next_job_id, i, (wrapped_code, half, tuple(color_ids), z_range))
+        return self._next_job_id
+
+    def cancel(self):
+        """取消執行中的工作；已經送達結果的行程只需丟棄結果而不必結束，其餘強制結束並換成備用行程"""
+        replaced = False
+        for i, worker in enumerate(self._workers):
+            if worker is None or worker.job_id is None: continue
+            try: worker.receive()
+            except (EOFError, OSError): pass
+            if worker.result is not None:
+                worker.job_id = worker.result = None; continue
+            worker.kill(); self._dying.append(worker)
+            with self._lock:
+                self._workers[i] = self._spares.pop(0) if self._spares else None
+            replaced = True
+        if replaced: self._start_refill()
+
+    def _start_refill(self):
+        """在背景執行緒中啟動新行程，補滿空出的位置與備用行程（spawn 啟動一個行程要數毫秒，不在 GUI 執行緒中進行）"""
+        if self._refill_thread is not None and self._refill_thread.is_alive(): return
+        self._refill_thread = threading.Thread(target=self._refill, name="rule-pool-refill", daemon=True)
+        self._refill_thread.start()
+
+    def _refill(self):
+        while not self._closed:
+            with self._lock:
+                missing = self._workers.count(None) + self.spare_count - len(self._spares)
+            if missing <= 0: return
+            worker = _Worker(self._ctx)
+            with self._lock:
+                if self._closed: worker.kill(); self._dying.append(worker); return
+                if None in self._workers: self._workers[self._workers.index(None)] = worker
+                else: self._spares.append(worker)
+
+    def _reap(self):
+        """回收已結束的行程"""
+        for worker in [w for w in self._dying if not w.process.is_alive()]:
+            worker.process.join(0); worker.conn.close(); self._dying.remove(worker)
+
+    def poll(self):
+        """非阻塞地檢查目前工作，完成、失敗或逾時時回傳 EvalResult，否則回傳 None"""
+        self._reap()
+        busy = self._busy_workers()
+        if not busy: return None
+        job_id, now = self._next_job_id, time.perf_counter()
+        elapsed = now - self._submitted_at
+        for worker in busy:
+            try:
+                worker.receive()
+            except (EOFError, OSError):
+                pass
+            if worker.result is not None:
+                _, slab_index, ok, payload, _ = worker.result
+                worker.job_id = worker.result = None
+                if not ok:
+                    self.cancel()
+                    return EvalResult(job_id, False, payload, elapsed)
+                self._slabs[slab_index] = payload
+            elif not worker.process.is_alive():
+                self.cancel()
+                return EvalResult(job_id, False, "執行程序意外結束", elapsed)
+        busy = self._busy_workers()
+        if busy:
+            if any(w.started_at is not None and now - w.started_at > self.timeout for w in busy):
+                self.cancel()
+                return EvalResult(job_id, False, f"執行超過 {self.timeout:g} 秒，已強制中止（是否有無窮迴圈？）", elapsed)
+            return None
+        slabs, self._slabs = self._slabs, []
+        volume = slabs[0] if len(slabs) == 1 else np.concatenate(slabs, axis=2)
+        return EvalResult(job_id, True, volume, elapsed)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = [w for w in self._workers + self._spares if w is not None]
+        if self._refill_thread is not None: self._refill_thread.join()
+        for worker in workers:
+            try: worker.conn.send(None)
+            except (OSError, ValueError): pass
+            worker.kill()
+        for worker in workers + self._dying:
+            worker.process.join(0.5); worker.conn.close()
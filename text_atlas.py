@@ -0,0 +1,59 @@
+# text_atlas.py
+"""把座標軸標籤用到的字元預先畫進一張貼圖 (glyph atlas)，再把字串排成貼圖四邊形的頂點資料"""
+import numpy as np
+from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QImage, QPainter, QFont, QFontMetrics
+
+ATLAS_CHARS = "-0123456789XYZ"
+LABEL_STRIDE = 10  # 每個頂點：錨點 3 + 像素偏移 2 + 貼圖座標 2 + 顏色 3 個 float32
+
+
+class GlyphAtlas:
+    """
+    以 QPainter 把每個字元畫進一張 RGBA 的 QImage（白字、透明背景），記錄各字元在貼圖中的位置與寬度。
+    需要在 QApplication 建立之後才能建構（字型由 Qt 提供）。
+    """
+    def __init__(self, chars=ATLAS_CHARS, family="Helvetica", pixel_size=18, padding=2):
+        font = QFont(family); font.setPixelSize(pixel_size); font.setBold(True)
+        metrics = QFontMetrics(font)
+        self.ascent, self.descent = metrics.ascent(), metrics.descent()
+        cell_h = self.ascent + self.descent + 2 * padding
+        widths = [metrics.horizontalAdvance(c) for c in chars]
+        self.width = sum(w + 2 * padding for w in widths)
+        self.height = cell_h
+        self.image = QImage(self.width, self.height, QImage.Format_RGBA8888)
+        self.image.fill(Qt.transparent)
+        painter = QPainter(self.image)
+        painter.setFont(font); painter.setPen(Qt.white)
+        self.glyphs = {}  # {char: (u0, u1, v_top, v_bottom, advance)}
+        x = 0
+        for char, advance in zip(chars, widths):
+            painter.drawText(QPoint(x + padding, padding + self.ascent), char)
+            # QImage 第一列即上傳後貼圖的 v = 0，所以字的頂端對應較小的 v
+            self.glyphs[char] = ((x + padding) / self.width, (x + padding + advance) / self.width,
+                                 padding / self.height, (padding + self.ascent + self.descent) / self.height, advance)
+            x += advance + 2 * padding
+        painter.end()
+
+    def pixels(self):
+        """貼圖像素 (height, width, 4) uint8，列的順序與 QImage 相同"""
+        data = self.image.constBits().asstring(self.image.byteCount())
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.image.bytesPerLine() // 4, 4)[:, :self.width]
+
+    def layout(self, labels):
+        """
+        labels 為 [(anchor (x, y, z), text, (r, g, b)), ...]。
+        每個字元產生一個四邊形，頂點的像素偏移以錨點為基線左端（與 glRasterPos 相同），
+        實際的螢幕位置由著色器依錨點投影後再加上偏移算出，因此文字大小不隨距離改變。
+        回傳長度 (字元數 * 4 * LABEL_STRIDE) 的 float32 陣列。
+        """
+        quads = []
+        for anchor, text, color in labels:
+            pen = 0.0
+            for char in text:
+                u0, u1, v_top, v_bottom, advance = self.glyphs[char]
+                for dx, dy, u, v in ((0, -self.descent, u0, v_bottom), (advance, -self.descent, u1, v_bottom),
+                                     (advance, self.ascent, u1, v_top), (0, self.ascent, u0, v_top)):
+                    quads.append((*anchor, pen + dx, dy, u, v, *color))
+                pen += advance
+        return np.array(quads, dtype=np.float32).reshape(-1)
@@ -0,0 +1,104 @@
+# verify.py
+"""
+不需要 PyQt / OpenGL / vpython 的解答驗證工具：讀取關卡與解答（編輯器中的程式碼本體），
+逐區段求值並與關卡比對（遇到第一個不同的格子就停止），輸出是否通過、分數、第一個不同的格子與各階段耗時。
+
+    python verify.py levels/level_1.json solution.py [--json] [--count] [--heatmap]
+
+結束代碼：0 通過、1 未通過、2 解答無法執行或關卡無法讀取。
+"""
+import argparse
+import json
+import sys
+import time
+
+from level_io import load_level
+from mesher import COLORS
+from rule_eval import wrap_code, compile_rule, compare_rule, score_code
+
+
+def verify_solution(level, code, count=False, heatmap=False):
+    """
+    level 為 level_io.load_level 的結果或關卡檔路徑，code 為程式碼本體。
+    回傳 {"passed", "score", "error", "mismatch", "timing": {"load", "compile", "compare"}}，時間以秒計；
+    mismatch 為第一個不同的格子 {"pos", "expected", "got"}，count / heatmap 為 True 時另外附上不同的格子數與 (x, y) 熱度圖。
+    """
+    timing = {}
+    start = time.perf_counter()
+    if isinstance(level, str): level = load_level(level)
+    target = level["store"].to_volume(level["half"])
+    timing["load"] = time.perf_counter() - start
+
+    # 解答中的 raise SystemExit / sys.exit() 也必須記為錯誤，否則會直接結束驗證並以「通過」的代碼 0 離開；
+    # 只有 Ctrl+C 與記憶體不足（交給批改工具記為 memory）繼續往外丟
+    start = time.perf_counter()
+    try:
+        rule_func = compile_rule(wrap_code(code))
+    except (KeyboardInterrupt, MemoryError):
+        raise
+    except BaseException as e:
+        timing["compile"] = time.perf_counter() - start
+        return {"passed": False, "score": 0, "error": f"{type(e).__name__}: {e}", "mismatch": None, "timing": timing}
+    timing["compile"] = time.perf_counter() - start
+
+    if target is None:
+        return {"passed": False, "score": 0, "error": "關卡方塊超出網格範圍", "mismatch": None, "timing": timing}
+    start = time.perf_counter()
+    try:
+        comparison = compare_rule(rule_func, target, level["half"], COLORS, count=count, heatmap=heatmap)
+    except (KeyboardInterrupt, MemoryError):
+        raise
+    except BaseException as e:
+        timing["compare"] = time.perf_counter() - start
+        return {"passed": False, "score": 0, "error": f"{type(e).__name__}: {e}", "mismatch": None, "timing": timing}
+    timing["compare"] = time.perf_counter() - start
+    result = {"passed": comparison.match, "score": score_code(code) if comparison.match else 0, "error": None, "mismatch": None, "timing": timing}
+    if comparison.first is not None:
+        x, y, z, expected, got = comparison.first
+        result["mismatch"] = {"pos": [x, y, z], "expected": expected, "got": got}
+    if count: result["count"] = comparison.count
+    if heatmap: result["heatmap"] = comparison.heatmap.tolist()
+    return result
+
+
+def format_heatmap(heatmap):
+    """熱度圖的文字版：俯視 (x 向右、y 向上)，每格為沿 Z 軸不同的格子數，超過 9 顯示 #"""
+    rows = []
+    for y in reversed(range(len(heatmap[0]))):
+        rows.append(" ".join("." if not heatmap[x][y] else (str(heatmap[x][y]) if heatmap[x][y] < 10 else "#") for x in range(len(heatmap))))
+    return "\n".join(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("level", help="關卡檔 (JSON 或 .vxl)")
+    parser.add_argument("solution", help="解答檔，內容與遊戲編輯器中的程式碼相同")
+    parser.add_argument("--json", action="store_true", help="以一行 JSON 輸出結果")
+    parser.add_argument("--count", action="store_true", help="檢查完整個網格並回報不同的格子數")
+    parser.add_argument("--heatmap", action="store_true", help="檢查完整個網格並輸出 (x, y) 熱度圖")
+    args = parser.parse_args(argv)
+
+    try:
+        level = load_level(args.level)
+        with open(args.solution, "r", encoding="utf-8") as f:
+            code = f.read()
+    except Exception as e:
+        print(f"錯誤：無法讀取輸入: {e}", file=sys.stderr)
+        return 2
+    result = verify_solution(level, code, count=args.count, heatmap=args.heatmap)
+    if args.json:
+        print(json.dumps(dict(result, level=level["name"]), ensure_ascii=False))
+    else:
+        status = "通過" if result["passed"] else ("錯誤" if result["error"] else "未通過")
+        print(f"{level['name']}: {status}  分數: {result['score']}")
+        if result["error"]: print(f"  {result['error']}")
+        if result["mismatch"]: print(f"  第一個不同的格子 {tuple(result['mismatch']['pos'])}：應為 {result['mismatch']['expected']}，結果為 {result['mismatch']['got']}")
+        if args.count: print(f"  不同的格子數: {result['count']}")
+        if args.heatmap: print(format_heatmap(result["heatmap"]))
+        print("  " + "  ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in result["timing"].items()))
+    if result["error"]: return 2
+    return 0 if result["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
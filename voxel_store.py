@@ -0,0 +1,124 @@
+# voxel_store.py
+"""以固定大小區塊 (chunk) 儲存的稀疏方塊資料，取代 {(x, y, z): color_id} 字典"""
+import numpy as np
+
+CHUNK_SIZE = 16
+
+
+def arrays_to_volume(positions, colors, half):
+    """由 (N, 3) 座標與 (N,) 顏色陣列（可以是唯讀的 memmap）直接寫入 dense volume；有方塊超出 [-half, half] 時回傳 None"""
+    if len(positions) and np.abs(positions).max() > half: return None
+    size = 2 * half + 1
+    volume = np.zeros((size, size, size), dtype=np.int8)
+    volume[tuple((np.asarray(positions, dtype=np.intp) + half).T)] = colors
+    return volume
+
+
+class ChunkedVoxelStore:
+    """
+    每個 16³ 區塊是一個 int8 NumPy 陣列，0 代表空白。
+    只有含方塊的區塊才會配置記憶體，因此大型關卡不必為每個方塊付出字典項目的成本。
+    """
+    def __init__(self):
+        self.chunks = {}  # {(cx, cy, cz): np.ndarray(shape=(16, 16, 16), dtype=int8)}
+
+    @classmethod
+    def from_arrays(cls, positions, colors):
+        """由 (N, 3) 座標陣列與 (N,) 顏色陣列建立；顏色為 0 的項目會被忽略"""
+        store = cls()
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        colors = np.asarray(colors, dtype=np.int8).reshape(-1)
+        keep = colors != 0
+        positions, colors = positions[keep], colors[keep]
+        if not len(positions): return store
+        keys = positions // CHUNK_SIZE  # 負座標也會正確地向下取整
+        local = positions - keys * CHUNK_SIZE
+        # 把區塊座標壓成單一整數再分組，比 np.unique(axis=0) 快得多
+        mins = keys.min(axis=0)
+        dims = keys.max(axis=0) - mins + 1
+        flat_keys = np.ravel_multi_index(tuple((keys - mins).T), dims)
+        unique_flat, inverse = np.unique(flat_keys, return_inverse=True)
+        unique_keys = np.stack(np.unravel_index(unique_flat, dims), axis=1) + mins
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+        for i, key in enumerate(map(tuple, unique_keys.tolist())):
+            idx = order[bounds[i]:bounds[i + 1]]
+            chunk = np.zeros((CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE), dtype=np.int8)
+            chunk[tuple(local[idx].T)] = colors[idx]
+            store.chunks[key] = chunk
+        return store
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """由關卡 JSON 的 [{"pos": [x, y, z], "color": c}, ...] 建立"""
+        positions = np.array([b["pos"] for b in blocks], dtype=np.int64).reshape(-1, 3)
+        colors = np.array([b["color"] for b in blocks], dtype=np.int8)
+        return cls.from_arrays(positions, colors)
+
+    @classmethod
+    def from_volume(cls, volume, half):
+        """由 dense volume（volume[x + half, y + half, z + half]）建立"""
+        positions = np.argwhere(volume)
+        return cls.from_arrays(positions - half, volume[tuple(positions.T)])
+
+    def to_arrays(self):
+        """回傳 (positions (N, 3) int32, colors (N,) int8)，依區塊與區塊內座標排序"""
+        positions, colors = [], []
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            local = np.argwhere(chunk)
+            positions.append(local + np.array(key) * CHUNK_SIZE)
+            colors.append(chunk[tuple(local.T)])
+        if not positions: return np.zeros((0, 3), dtype=np.int32), np.zeros(0, dtype=np.int8)
+        return np.concatenate(positions).astype(np.int32), np.concatenate(colors)
+
+    def to_volume(self, half):
+        """轉成 dense volume；若有方塊超出 [-half, half] 的網格範圍則回傳 None"""
+        return arrays_to_volume(*self.to_arrays(), half)
+
+    def to_blocks(self):
+        return [{"pos": list(pos), "color": cid} for pos, cid in self.items()]
+
+    def items(self):
+        positions, colors = self.to_arrays()
+        return zip(map(tuple, positions.tolist()), colors.tolist())
+
+    def extent(self):
+        """所有方塊座標絕對值的最大值，用來推算容納它們所需的網格大小"""
+        positions, _ = self.to_arrays()
+        return int(np.abs(positions).max()) if len(positions) else 0
+
+    def get(self, pos, default=0):
+        key, local = self._split(pos)
+        chunk = self.chunks.get(key)
+        if chunk is None: return default
+        return int(chunk[local]) or default
+
+    def set(self, pos, color_id):
+        """設定單一方塊；color_id 為 0 時刪除該方塊"""
+        key, local = self._split(pos)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not color_id: return
+            chunk = self.chunks[key] = np.zeros((CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE), dtype=np.int8)
+        chunk[local] = color_id
+        if not color_id and not chunk.any(): del self.chunks[key]
+
+    @staticmethod
+    def _split(pos):
+        key = tuple(c // CHUNK_SIZE for c in pos)
+        local = tuple(c - k * CHUNK_SIZE for c, k in zip(pos, key))
+        return key, local
+
+    def __len__(self):
+        return sum(int(np.count_nonzero(chunk)) for chunk in self.chunks.values())
+
+    def __contains__(self, pos):
+        return self.get(pos) != 0
+
+    def __eq__(self, other):
+        if not isinstance(other, ChunkedVoxelStore): return NotImplemented
+        mine = {k: c for k, c in self.chunks.items() if c.any()}
+        theirs = {k: c for k, c in other.chunks.items() if c.any()}
+        return mine.keys() == theirs.keys() and all(np.array_equal(mine[k], theirs[k]) for k in mine)